@@ -1,7 +1,17 @@
 """ A custom csv reader class """
 
 from . import csvreader
+from . import columnar
+from . import csvindex
+from . import cache
+from . import lookup
+from . import aggregate
 
 __all__ = [
-    'csvreader'
+    'csvreader',
+    'columnar',
+    'csvindex',
+    'cache',
+    'lookup',
+    'aggregate',
 ]
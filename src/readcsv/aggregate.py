@@ -0,0 +1,234 @@
+"""
+provides Aggregate, for computing counts, sums, minimums, maximums and means per group of a csv file while parsing it,
+without keeping the rows
+"""
+# pylint: disable=missing-function-docstring
+import os
+import sys
+import operator
+import concurrent.futures
+
+from readcsv.csvreader import CsvReader, _RangeReader, _RangeLines, _Picklable
+
+AGGREGATES = [ 'count', 'sum', 'min', 'max', 'mean' ]
+
+# The aggregates whose column is converted to float unless it is given a type
+NUMERIC_AGGREGATES = [ 'sum', 'min', 'max', 'mean' ]
+
+class AggregateResult:
+    """
+    The result of Aggregate: the state of each aggregate for each group, keyed on the value of the by column
+    (or a tuple of the values of the by columns, or () if there are none).
+    States are small and picklable, and Merge() combines the states from another result (for example from another
+    file, or another part of a file), so results can be produced separately and combined.
+    GetResults() returns a dict of { key: { name: value } }, get(key) the values for one group, and len(result)
+    is the number of groups.
+    """
+    def __init__(self, by, aggs, groups=None, error=None):
+        self.by = by
+        self.aggs = aggs
+        self.groups = groups if groups is not None else {}
+        self.error = error
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __contains__(self, key):
+        return key in self.groups
+
+    def keys(self):
+        return self.groups.keys()
+
+    def GetError(self):
+        return self.error
+
+    def NewState(self):
+        return [ [ 0, 0 ] if kind == 'mean' else (None if kind in ('min', 'max') else 0) for _column, kind in self.aggs.values() ]
+
+    def Update(self, rows, get_key, positions):
+        """ Add a block of (list) rows, where get_key returns a row's key and positions are the index of each aggregate's column """
+        buckets = {}
+        for key, row in zip(map(get_key, rows), rows):
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [ row ]
+            else:
+                bucket.append(row)
+        kinds = [ kind for _column, kind in self.aggs.values() ]
+        groups = self.groups
+        for key, bucket in buckets.items():
+            state = groups.get(key)
+            if state is None:
+                state = groups[key] = self.NewState()
+            for idx, (kind, pos) in enumerate(zip(kinds, positions)):
+                if pos is None:
+                    # Counting rows
+                    state[idx] += len(bucket)
+                    continue
+                values = [ row[pos] for row in bucket ]
+                if None in values or '' in values:
+                    values = [ value for value in values if value is not None and value != '' ]
+                if not values:
+                    continue
+                self.Combine(state, idx, kind, len(values) if kind in ('count', 'mean') else None,
+                             sum(values) if kind in ('sum', 'mean') else None,
+                             min(values) if kind == 'min' else (max(values) if kind == 'max' else None))
+
+    @staticmethod
+    def Combine(state, idx, kind, count, total, extreme):
+        if kind == 'count':
+            state[idx] += count
+        elif kind == 'sum':
+            state[idx] += total
+        elif kind == 'mean':
+            state[idx][0] += total
+            state[idx][1] += count
+        elif state[idx] is None:
+            state[idx] = extreme
+        elif kind == 'min':
+            state[idx] = min(state[idx], extreme)
+        else:
+            state[idx] = max(state[idx], extreme)
+
+    def Merge(self, other):
+        """ Add the states of another AggregateResult (for the same by and aggs) into this one, returning this one """
+        if other.error and not self.error:
+            self.error = other.error
+        kinds = [ kind for _column, kind in self.aggs.values() ]
+        for key, other_state in other.groups.items():
+            state = self.groups.get(key)
+            if state is None:
+                self.groups[key] = [ list(value) if isinstance(value, list) else value for value in other_state ]
+                continue
+            for idx, (kind, value) in enumerate(zip(kinds, other_state)):
+                if kind == 'mean':
+                    self.Combine(state, idx, kind, value[1], value[0], None)
+                elif value is not None:
+                    self.Combine(state, idx, kind, value, value, value)
+        return self
+
+    def get(self, key, default=None):
+        state = self.groups.get(key)
+        if state is None:
+            return default
+        return self.Finish(state)
+
+    def Finish(self, state):
+        """ Return the final values of a group's state, as a dict of { name: value } """
+        ret = {}
+        for (name, (_column, kind)), value in zip(self.aggs.items(), state):
+            if kind == 'mean':
+                value = value[0] / value[1] if value[1] else None
+            ret[name] = value
+        return ret
+
+    def GetResults(self):
+        return { key: self.Finish(state) for key, state in self.groups.items() }
+
+def _Aggregate(reader, blocks, result, by, aggs):
+    """ Aggregate the blocks of rows from a reader into result """
+    get_key = positions = None
+    for rows in blocks:
+        if get_key is None:
+            columns = reader.GetOutputColumns()
+            known = reader.GetColumns()
+            missing = [ col for col in by + [ column for column, _kind in aggs.values() if column is not None ] if col not in known ]
+            if missing:
+                reader.SetError("Unknown column {} for Aggregate".format(missing[0]))
+                break
+            if len(by) == 1:
+                get_key = operator.itemgetter(columns.index(by[0]))
+            elif by:
+                # itemgetter with several indexes returns a tuple
+                get_key = operator.itemgetter(*[ columns.index(col) for col in by ])
+            else:
+                get_key = lambda row: ()
+            positions = [ None if column is None else columns.index(column) for column, _kind in aggs.values() ]
+        width = len(reader.GetOutputColumns())
+        if any(len(row) < width for row in rows):
+            missing_value = reader.missing_values
+            rows = [ row + [ missing_value ] * (width - len(row)) if len(row) < width else row for row in rows ]
+        result.Update(rows, get_key, positions)
+    result.error = reader.error
+    return result
+
+def _AggregateRange(path, start, end, options, header, by, aggs):
+    """
+    Aggregate the lines within a byte range of a file (see _RangeReader).
+    Runs within a worker process for Aggregate
+    """
+    # pylint: disable=bare-except
+    reader = _RangeReader(options, header)
+    result = AggregateResult(by, aggs)
+    try:
+        _Aggregate(reader, reader.ProcessBlocks(_RangeLines(reader, path, start, end)), result, by, aggs)
+    except:
+        result.error = "Failed processing line:" + (reader.failed_line or "")
+    return result
+
+def Aggregate(path, by, aggs, workers=None, chunk_size=None, **options):
+    """
+    Read a csv file (or each of a list of files), returning an AggregateResult of the aggregates for each group of rows
+    with the same values in the by column (or list of columns).
+    aggs maps each result name to a (column, aggregate) pair, where aggregate is one of 'count' (the number of values,
+    or of rows if column is None), 'sum', 'min', 'max' or 'mean'. Missing and empty values are ignored.
+    Only the by and aggregated columns are split out of each line (see usecols) and converted: the columns of
+    'sum', 'min', 'max' and 'mean' are converted to float unless they are given another type in types.
+    Rows are aggregated a block at a time as they are parsed, so memory use depends on the number of groups, not rows.
+    If workers is more than 1, the file is split into byte ranges of about chunk_size bytes (see CsvReader.ParallelRead)
+    which are aggregated in a pool of worker processes, and the results merged. Compressed files, pipes, extra_columns_method
+    'store', and options which can not be passed to a worker process (such as a lambda in where) are read serially.
+    If a worker process fails, the error is set to "Failed reading file ...".
+    The other reader options are as for CsvReader (dictify, row_type, lazy, infer_types and return_header_row are not used).
+    """
+    # pylint: disable=too-many-locals,bare-except
+    by = list(by) if isinstance(by, (list, tuple)) else [ by ]
+    aggs = dict(aggs)
+    for name, (column, kind) in aggs.items():
+        if kind not in AGGREGATES or (column is None and kind != 'count'):
+            raise ValueError("Unsupported aggregate {} for {}".format(kind, name))
+    if isinstance(path, (list, tuple)):
+        result = AggregateResult(by, aggs)
+        for one in path:
+            result.Merge(Aggregate(one, by, aggs, workers=workers, chunk_size=chunk_size, **options))
+        return result
+
+    types = dict(options.get('types') or {})
+    for column, kind in aggs.values():
+        if kind in NUMERIC_AGGREGATES:
+            types.setdefault(column, 'float')
+    usecols = []
+    for column in by + [ column for column, _kind in aggs.values() ]:
+        if column is not None and column not in usecols:
+            usecols.append(column)
+    options.update(types=types, usecols=usecols, dictify=False, row_type=None, lazy=False, infer_types=False,
+                   return_header_row=False, keep_rows=False)
+    reader = CsvReader(**options)
+    result = AggregateResult(by, aggs)
+    if (not workers or workers <= 1 or not os.path.isfile(path) or reader.GetCompression(path) is not None
+            or 'store' in reader.extra_columns_method or not _Picklable(reader.options)):
+        return _Aggregate(reader, reader.ReadBlocks(path), result, by, aggs)
+
+    with open(path, 'rb') as fh:
+        # Process the lines to be skipped, and the header, here
+        while reader.header is None or (reader.skip_count or 0) > 0:
+            raw = fh.readline()
+            if not raw or reader.error:
+                break
+            reader.ProcessLine(reader.DecodeBytes(raw))
+        ranges = reader.ByteRanges(fh, workers, chunk_size)
+    if reader.error or reader.header is None:
+        result.error = reader.error
+        return result
+    options = dict(reader.options, backend=reader.active_backend or reader.backend, stats_callback=None)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [ pool.submit(_AggregateRange, path, start, end, options, reader.header, by, aggs) for start, end in ranges ]
+            for future in futures:
+                result.Merge(future.result())
+    except:
+        # A worker process failed
+        result.error = "Failed reading file {}: {}".format(path, sys.exc_info()[1])
+    if result.error:
+        reader.SetError(result.error)
+    return result
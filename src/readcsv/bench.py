@@ -0,0 +1,401 @@
+""" benchmarks for readcsv """
+
+# pylint: disable=missing-function-docstring
+
+import sys
+import os
+import json
+import argparse
+import tempfile
+import shutil
+import importlib
+import random
+import subprocess
+import timeit
+import itertools
+import tracemalloc
+
+from readcsv.csvreader import CsvReader
+
+def msg(*args):
+    print(" ".join(str(x) for x in args), file=sys.stderr)
+
+def legacy_split_line(line, sep=',', qc='"'):
+    """The original generator based SplitLine, kept for comparison in the benchmarks"""
+    # pylint: disable=too-many-statements,too-many-return-statements
+    beg = 0
+    quote_idx = line.find(qc)
+    if quote_idx < 0:
+        yield from line.split(sep)
+        return
+
+    sz = len(line)
+    beg = 0
+    inquote = False
+    keep = ""
+    while True:
+        next_sep = line.find(sep, beg)
+        next_quote = line.find(qc, beg)
+        #msg("{} of {} got next {}={}, next {}={}", beg, sz, sep, next_sep, qc, next_quote)
+        if beg >= sz:
+            yield keep
+            return
+        if inquote and next_sep == beg: # Comma within quoted section, accumulate it
+            keep += sep
+            beg += 1
+            continue
+        if next_sep == beg: # Comma starting next field. Return anything accumulated
+            yield keep
+            keep = ""
+            beg +=1
+            continue
+        if inquote and next_quote == beg: # End quoted section, continue looking for sep
+            keep += line[beg:next_quote]
+            beg +=1
+            inquote = False
+            continue
+        if next_quote == beg: # Begin quoted section, skip this single quote.
+            inquote = True
+            beg +=1
+            continue
+        if inquote and next_quote > beg: # Accumulate up to the next quote, if one found
+            keep += line[beg:next_quote]
+            beg = next_quote + 1 # skip this quote
+            inquote = False
+            continue
+        if inquote and next_quote <= beg: # In quoted section,but no more quotes avail.
+            keep += line[beg:] # Accumlate everything to end of line
+            yield keep
+            keep = ""
+            return # Finish
+        if 0 < next_sep < next_quote:  # From this point on, inquote==False
+            keep += line[beg:next_sep]  # There is another quote, but next comma is closer than next quote
+            beg = next_sep + 1
+            yield keep
+            keep = ""
+            continue
+        if  next_sep > 0 and next_sep > next_quote >= beg:
+            # Accumulate up to the quote and begin quoted section.
+            keep += line[beg:next_quote]
+            beg = next_quote + 1
+            inquote = True
+            continue
+        if next_sep > 0 and next_quote <=beg:
+            keep += line[beg:next_sep]
+            beg = next_sep + 1
+            yield keep
+            keep = ""
+            continue
+        if next_sep < 0 <= next_quote:
+            keep += line[beg:next_quote]
+            beg = next_quote + 1
+            inquote = True
+            continue
+        if next_sep < 0 and next_quote < 0:
+            # Neither separator or quote have been seen.
+            # Grab to the end of the line, and finish.
+            keep += line[beg]
+            yield keep
+            keep = ""
+            return
+        msg("This should never happen")
+        return
+    return
+
+def generate_csv(path, rows, width=8, quote_rate=0.0, trailing_comma_rate=0.0, extra_column_rate=0.0, seed=0):
+    """
+    Write a synthetic csv file with a header and the requested number of data rows.
+    quote_rate is the fraction of fields which are quoted (and contain a separator),
+    trailing_comma_rate is the fraction of lines ending with an extra comma,
+    and extra_column_rate is the fraction of lines with two more values than the header.
+    """
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        print(",".join("col{}".format(c) for c in range(width)), file=f)
+        for r in range(rows):
+            fields = [ '"{},{}"'.format(r, c) if quote_rate and rng.random() < quote_rate else "{}_{}".format(r, c) for c in range(width) ]
+            if extra_column_rate and rng.random() < extra_column_rate:
+                fields += [ "x{}".format(r), "y{}".format(r) ]
+            line = ",".join(fields)
+            if trailing_comma_rate and rng.random() < trailing_comma_rate:
+                line += ","
+            print(line, file=f)
+
+def peak_rss_kb():
+    # pylint: disable=import-outside-toplevel
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def read_all(path, **flags):
+    """Read every row of a file, discarding them, and return the row count"""
+    reader = CsvReader(**flags)
+    count = 0
+    for _row in reader.Read(path):
+        count += 1
+    return count
+
+def measure_read_rss(path, **flags):
+    """Read a file in a fresh interpreter and return its peak RSS in kB"""
+    cmd = [ sys.executable, "-m", "readcsv.bench", "read-rss", path, json.dumps(flags) ]
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(out)
+
+def bench_memory(rows=100000, factors=(1, 4, 16), tolerance=1.5, **flags):
+    """
+    Read files of increasing size and check that the peak RSS stays flat.
+    Returns (ok, results) where results lists the rows and peak RSS of each run.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for factor in factors:
+            path = os.path.join(tmpdir, "bench_{}.csv".format(factor))
+            generate_csv(path, rows * factor)
+            stats = measure_read_rss(path, **flags)
+            stats["bytes"] = os.path.getsize(path)
+            results.append(stats)
+            os.unlink(path)
+    baseline = results[0]["peak_rss_kb"]
+    ok = all(r["peak_rss_kb"] <= baseline * tolerance for r in results)
+    return ok, results
+
+COMPRESSIONS = [ "gzip", "bz2", "lzma" ]
+
+def time_read(path, **flags):
+    start = timeit.default_timer()
+    count = read_all(path, **flags)
+    return count, timeit.default_timer() - start
+
+def bench_compressed(rows=200000, compressions=None):
+    """
+    Compare reading compressed files directly (with and without the decompression thread)
+    against decompressing to a temporary file and then reading that, reporting the seconds taken by each
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "bench.csv")
+        generate_csv(path, rows, quote_rate=0.1)
+        for name in compressions or COMPRESSIONS:
+            module = importlib.import_module(name)
+            compressed = path + "." + name
+            with open(path, "rb") as src, module.open(compressed, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+
+            start = timeit.default_timer()
+            plain = os.path.join(tmpdir, "decompressed.csv")
+            with module.open(compressed, "rb") as src, open(plain, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            count, elapsed = time_read(plain)
+            to_disk = timeit.default_timer() - start
+            os.unlink(plain)
+
+            streamed_count, streamed = time_read(compressed)
+            threaded_count, threaded = time_read(compressed, decompress_thread=True)
+            assert count == streamed_count == threaded_count == rows + 1
+            results[name] = {
+                "bytes": os.path.getsize(compressed),
+                "decompress_to_disk_sec": to_disk,
+                "read_plain_sec": elapsed,
+                "streamed_sec": streamed,
+                "threaded_sec": threaded,
+            }
+    return results
+
+SPLIT_INPUTS = {
+    "unquoted": ",".join("field{}".format(c) for c in range(20)),
+    "quoted": ",".join('"field,{}"'.format(c) if c % 2 else "field{}".format(c) for c in range(20)),
+    "quoted-all": ",".join('"field {}"'.format(c) for c in range(20)),
+}
+
+def bench_split(number=20000):
+    """Compare SplitLine against the original generator implementation, reporting lines/s"""
+    reader = CsvReader()
+    results = {}
+    for name, line in SPLIT_INPUTS.items():
+        assert reader.SplitLine(line) == list(legacy_split_line(line))
+        current = timeit.timeit(lambda line=line: reader.SplitLine(line), number=number)
+        legacy = timeit.timeit(lambda line=line: list(legacy_split_line(line)), number=number)
+        results[name] = {
+            "lines_per_sec": number / current,
+            "legacy_lines_per_sec": number / legacy,
+            "speedup": legacy / current,
+        }
+    return results
+
+# The dataset shapes used by the suite
+DATASETS = {
+    "narrow": dict(width=4),
+    "wide": dict(width=40),
+    "quoted": dict(width=8, quote_rate=0.5),
+    "trailing-comma": dict(width=8, trailing_comma_rate=0.5),
+    "extra-columns": dict(width=8, extra_column_rate=0.1),
+}
+
+# The extra_columns_method values from the CsvReader class docstring
+EXTRA_COLUMNS_METHODS = {
+    "generate": dict(extra_columns_method="generate", extra_columns="column_{}"),
+    "append-last": dict(extra_columns_method="append-last"),
+    "append-last:as-list": dict(extra_columns_method="append-last:as-list"),
+    "store": dict(extra_columns_method="store", extra_columns="extra_data"),
+    "store:as-list": dict(extra_columns_method="store:as-list", extra_columns="extra_data"),
+}
+
+ENTRY_POINTS = [ "Read", "ProcessLines", "ProcessData" ]
+
+def run_case(entry, path, text, lines, flags):
+    """Run one entry point over the data and return the number of rows produced"""
+    reader = CsvReader(**flags)
+    if entry == "Read":
+        rows = reader.Read(path)
+    elif entry == "ProcessLines":
+        rows = reader.ProcessLines(lines)
+    else:
+        rows = reader.ProcessData(text)
+    count = 0
+    for _row in rows:
+        count += 1
+    return count
+
+def bench_case(entry, path, text, lines, flags, memory=True):
+    """Time one case, and optionally measure its peak (python heap) memory with tracemalloc"""
+    start = timeit.default_timer()
+    count = run_case(entry, path, text, lines, flags)
+    elapsed = timeit.default_timer() - start
+    result = {
+        "rows": count,
+        "seconds": elapsed,
+        "rows_per_sec": count / elapsed if elapsed else 0.0,
+        "mb_per_sec": len(text) / (1024 * 1024) / elapsed if elapsed else 0.0,
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            run_case(entry, path, text, lines, flags)
+            result["peak_memory_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return result
+
+def bench_suite(rows=20000, datasets=None, entries=None, memory=True, progress=None):
+    """
+    Run every entry point over every dataset, for each combination of dictify and extra_columns_method.
+    Returns a dict of results keyed by "dataset/entry/method/dictify".
+    """
+    results = {}
+    datasets = datasets or list(DATASETS)
+    entries = entries or ENTRY_POINTS
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in datasets:
+            path = os.path.join(tmpdir, name + ".csv")
+            generate_csv(path, rows, **DATASETS[name])
+            with open(path) as f:
+                text = f.read()
+            lines = text.splitlines()
+            for entry, method, dictify in itertools.product(entries, EXTRA_COLUMNS_METHODS, [ False, True ]):
+                flags = dict(EXTRA_COLUMNS_METHODS[method], dictify=dictify, dict_type=dict, quiet=True)
+                key = "{}/{}/{}/{}".format(name, entry, method, "dictify" if dictify else "list")
+                results[key] = bench_case(entry, path, text, lines, flags, memory=memory)
+                if progress:
+                    progress(key, results[key])
+            os.unlink(path)
+    return results
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compare two sets of suite results, returning a list of regressions: cases where rows/s dropped,
+    or peak memory grew, by more than the threshold fraction.
+    """
+    regressions = []
+    for key, base in sorted(baseline.items()):
+        cur = current.get(key)
+        if cur is None:
+            continue
+        if cur["rows_per_sec"] < base["rows_per_sec"] * (1 - threshold):
+            regressions.append({ "case": key, "metric": "rows_per_sec", "baseline": base["rows_per_sec"], "current": cur["rows_per_sec"] })
+        if "peak_memory_kb" in base and "peak_memory_kb" in cur:
+            if cur["peak_memory_kb"] > base["peak_memory_kb"] * (1 + threshold):
+                regressions.append({ "case": key, "metric": "peak_memory_kb", "baseline": base["peak_memory_kb"], "current": cur["peak_memory_kb"] })
+    return regressions
+
+def load_results(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("results", data)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="readcsv.bench", description="readcsv benchmarks")
+    sub = parser.add_subparsers(dest="command")
+
+    run = sub.add_parser("run", help="run the benchmark suite and report the results as json")
+    run.add_argument("--rows", type=int, default=20000)
+    run.add_argument("--dataset", action="append", choices=list(DATASETS), help="dataset to run (default all)")
+    run.add_argument("--entry", action="append", choices=ENTRY_POINTS, help="entry point to run (default all)")
+    run.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    run.add_argument("--output", help="also save the results to this file")
+    run.add_argument("--baseline", help="compare against results saved from a previous run")
+    run.add_argument("--threshold", type=float, default=0.1)
+
+    compare = sub.add_parser("compare", help="compare two saved results, flagging regressions")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.1)
+
+    mem = sub.add_parser("memory", help="check that peak memory stays flat as the input grows")
+    mem.add_argument("--rows", type=int, default=100000)
+    mem.add_argument("--tolerance", type=float, default=1.5)
+    mem.add_argument("--keep-rows", action="store_true")
+
+    split = sub.add_parser("split", help="compare SplitLine against the original implementation")
+    split.add_argument("--number", type=int, default=20000)
+
+    compressed = sub.add_parser("compressed", help="compare reading compressed files against decompressing them to disk first")
+    compressed.add_argument("--rows", type=int, default=200000)
+    compressed.add_argument("--compression", action="append", choices=COMPRESSIONS, help="compression to run (default all)")
+
+    rss = sub.add_parser("read-rss", help="(internal) read a file and report the peak RSS")
+    rss.add_argument("path")
+    rss.add_argument("flags", nargs="?", default="{}")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "read-rss":
+        count = read_all(args.path, **json.loads(args.flags))
+        print(json.dumps({"rows": count, "peak_rss_kb": peak_rss_kb()}))
+        return 0
+
+    if args.command == "run":
+        results = bench_suite(rows=args.rows, datasets=args.dataset, entries=args.entry, memory=not args.no_memory,
+                              progress=lambda key, result: msg(key, int(result["rows_per_sec"]), "rows/s"))
+        report = { "rows": args.rows, "results": results }
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        ok = True
+        if args.baseline:
+            report["regressions"] = compare_results(load_results(args.baseline), results, args.threshold)
+            ok = not report["regressions"]
+        print(json.dumps(report, indent=2))
+        return 0 if ok else 1
+
+    if args.command == "compare":
+        regressions = compare_results(load_results(args.baseline), load_results(args.current), args.threshold)
+        print(json.dumps({ "regressions": regressions }, indent=2))
+        return 1 if regressions else 0
+
+    if args.command == "memory":
+        ok, results = bench_memory(rows=args.rows, tolerance=args.tolerance, keep_rows=args.keep_rows)
+        print(json.dumps({"ok": ok, "results": results}, indent=2))
+        return 0 if ok else 1
+
+    if args.command == "compressed":
+        print(json.dumps(bench_compressed(rows=args.rows, compressions=args.compression), indent=2))
+        return 0
+
+    if args.command == "split":
+        print(json.dumps(bench_split(number=args.number), indent=2))
+        return 0
+
+    parser.print_help()
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
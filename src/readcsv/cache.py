@@ -0,0 +1,184 @@
+"""
+provides CachedCsvReader, a CsvReader which keeps the parsed rows of files in a cache so that reading
+the same file again with the same options does not parse it again
+"""
+# pylint: disable=missing-function-docstring
+import os
+import sys
+import types
+import pickle
+import hashlib
+import collections
+
+from readcsv.csvreader import CsvReader
+
+# The constructor options which do not affect the rows produced, and so are not part of the cache key
+UNKEYED_OPTIONS = [ 'quiet', 'msg', 'raise_error', 'keep_rows', 'read_size', 'block_size', 'mmap', 'decompress_thread',
+                    'backend_sample', 'stats', 'stats_callback', 'stats_every', 'stats_sample' ]
+
+class ParseCache:
+    """
+    A cache of parsed files: an in-process LRU holding at most about max_bytes of rows (estimated from a sample of them),
+    plus, if directory is given, a pickled copy of each entry in that directory which is used when an entry is not
+    in memory (including by other processes).
+    Entries are keyed on the file's real path, size and modification time (or a hash of its content, if hash_content
+    is True) and the reader's options. Functions and classes in the options are keyed by their module and qualified name;
+    files read with options which can not be keyed (such as a lambda, or a nested function) are not cached.
+    """
+    def __init__(self, max_bytes=256*1024*1024, directory=None, hash_content=False):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hash_content = hash_content
+        self.entries = collections.OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def Key(self, path, options):
+        st = os.stat(path)
+        if self.hash_content:
+            digest = hashlib.sha1()
+            with open(path, 'rb') as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            identity = (st.st_size, digest.hexdigest())
+        else:
+            identity = (st.st_size, st.st_mtime_ns)
+        keyed = sorted((name, self.KeyValue(value)) for name, value in options.items() if name not in UNKEYED_OPTIONS)
+        return hashlib.sha1(repr((os.path.realpath(path), identity, keyed)).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def KeyValue(cls, value):
+        """
+        Return a string identifying an option value for the cache key, or raise ValueError if it has none: the repr of
+        a function (or of anything holding one) includes its address, which another function can later reuse
+        """
+        if isinstance(value, dict):
+            return "{" + ", ".join(sorted(repr(key) + ": " + cls.KeyValue(item) for key, item in value.items())) + "}"
+        if isinstance(value, (set, frozenset)):
+            return "set(" + ", ".join(sorted(map(cls.KeyValue, value))) + ")"
+        if isinstance(value, (list, tuple)):
+            return type(value).__name__ + "(" + ", ".join(map(cls.KeyValue, value)) + ")"
+        if isinstance(value, (types.FunctionType, type)):
+            if '<' in value.__qualname__:
+                # A lambda, or a function or class defined within a function
+                raise ValueError("{} can not be part of a cache key".format(value.__qualname__))
+            return value.__module__ + "." + value.__qualname__
+        key = repr(value)
+        if " at 0x" in key:
+            # Such as a bound method, or a functools.partial
+            raise ValueError("{} can not be part of a cache key".format(key))
+        return key
+
+    def DiskPath(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def Get(self, key):
+        """ Return the (rows, state) for a key, or None """
+        # pylint: disable=bare-except
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+        if self.directory is not None:
+            try:
+                with open(self.DiskPath(key), 'rb') as fh:
+                    rows, state = pickle.load(fh)
+            except:
+                rows = None
+            if rows is not None:
+                self.hits += 1
+                self.Remember(key, rows, state)
+                return rows, state
+        self.misses += 1
+        return None
+
+    def Put(self, key, rows, state):
+        """ Store the rows and reader state from parsing a file """
+        # pylint: disable=bare-except
+        self.Remember(key, rows, state)
+        if self.directory is not None:
+            tmp = self.DiskPath(key) + '.tmp'
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(tmp, 'wb') as fh:
+                    pickle.dump((rows, state), fh, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self.DiskPath(key))
+            except:
+                pass
+
+    def Remember(self, key, rows, state):
+        size = self.EstimateSize(rows)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)[2]
+        self.entries[key] = (rows, state, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _key, (_rows, _state, evicted) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted
+
+    @staticmethod
+    def EstimateSize(rows, sample=100):
+        """ Estimate the memory used by a list of rows, from the sizes of (up to) sample of them """
+        if not rows:
+            return sys.getsizeof(rows)
+        step = max(len(rows) // sample, 1)
+        sampled = rows[::step]
+        total = 0
+        for row in sampled:
+            values = row.values() if hasattr(row, 'values') and not isinstance(row, list) else row
+            total += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+        return sys.getsizeof(rows) + total * len(rows) // len(sampled)
+
+    def Clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+# The cache used by CachedCsvReader when none is given
+DEFAULT_CACHE = ParseCache()
+
+class CachedCsvReader(CsvReader):
+    """
+    A CsvReader whose Read() (and ReadBatches()) keeps the rows of each file it reads in a ParseCache
+    (by default, a cache shared by every CachedCsvReader in the process), and serves later reads of the same,
+    unchanged, file with the same options from the cache without parsing it.
+    After a read served from the cache, the header, GetColumns(), row counters and types are as if the file had been parsed.
+    The cached rows are shared between reads, so they should not be modified.
+    Only complete reads without errors, by a reader which has not already processed any lines, are cached.
+    """
+    def __init__(self, cache=None, **options):
+        self.cache = cache if cache is not None else DEFAULT_CACHE
+        super().__init__(**options)
+
+    def ReadBlocks(self, f):
+        # pylint: disable=bare-except
+        key = None
+        if self.absolute_row_number == -1:
+            # The cache only applies to reading a file with a fresh reader
+            try:
+                key = self.cache.Key(f, self.options)
+            except:
+                pass
+        cached = self.cache.Get(key) if key is not None else None
+        if cached is not None:
+            self.error = None
+            rows, state = cached
+            self.SetState(state)
+            if self.keep_rows:
+                self.rows.extend(rows)
+            for start in range(0, len(rows), self.block_size):
+                yield rows[start:start + self.block_size]
+            return
+
+        parsed = []
+        for rows in super().ReadBlocks(f):
+            parsed.extend(rows)
+            yield rows
+        if key is not None and not self.error:
+            self.cache.Put(key, parsed, self.GetState())
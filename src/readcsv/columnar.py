@@ -0,0 +1,293 @@
+"""
+provides ReadColumns, for reading a csv file into compact array-backed columns rather than per-row lists or dicts
+"""
+# pylint: disable=missing-function-docstring
+import io
+import array
+import itertools
+import importlib
+
+from readcsv.csvreader import CsvReader
+
+TYPECODES = {
+    int: 'q',
+    'int': 'q',
+    float: 'd',
+    'float': 'd',
+}
+
+# The reader's names of the types which may be given as a class
+READER_TYPES = {
+    int: 'int',
+    float: 'float',
+    str: 'str',
+}
+
+def _Numpy():
+    # numpy is a soft dependency only
+    try:
+        # pylint: disable=bare-except
+        return importlib.import_module("numpy")
+    except:
+        return None
+
+class StringColumn:
+    """
+    A column of strings, stored as a single text buffer plus an array of offsets into it.
+    Missing values (None) are recorded in a mask.
+    """
+    def __init__(self):
+        self.buf = io.StringIO()
+        self.text = None
+        self.offsets = array.array('q', [0])
+        self.missing = bytearray()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if self.missing[idx]:
+            return None
+        text = self.GetText()
+        return text[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def __iter__(self):
+        text = self.GetText()
+        offsets = self.offsets
+        for idx, missing in enumerate(self.missing):
+            yield None if missing else text[offsets[idx]:offsets[idx + 1]]
+
+    def GetText(self):
+        """ Return the text buffer containing all of the values """
+        return self.text if self.text is not None else self.buf.getvalue()
+
+    def Extend(self, values):
+        """ Add a sequence of values, raising TypeError (without adding any) if any are not strings or None """
+        try:
+            text = "".join(values)
+            missing = bytes(len(values))
+        except TypeError:
+            if not all(v is None or isinstance(v, str) for v in values):
+                raise
+            missing = bytes(v is None for v in values)
+            values = [ "" if v is None else v for v in values ]
+            text = "".join(values)
+        offsets = itertools.accumulate(itertools.chain([ self.offsets[-1] ], map(len, values)))
+        next(offsets)
+        self.offsets.extend(offsets)
+        self.missing.extend(missing)
+        self.buf.write(text)
+
+    def Finish(self, **_kwargs):
+        self.text = self.buf.getvalue()
+        self.buf = None
+
+class ArrayColumn:
+    """
+    A column of numbers, stored in an array.array (or a numpy array once finished, when numpy is available).
+    Missing values are recorded in a mask (and stored as 0).
+    """
+    def __init__(self, typecode):
+        self.typecode = typecode
+        self.convert = float if typecode == 'd' else int
+        self.values = array.array(typecode)
+        self.missing = bytearray()
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, idx):
+        if self.missing[idx]:
+            return None
+        return self.values[idx]
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def Extend(self, values):
+        """ Add a sequence of values, converting them, with empty strings and None treated as missing """
+        if None in values or "" in values:
+            missing = bytes(v is None or v == "" for v in values)
+            values = [ 0 if v is None or v == "" else v for v in values ]
+        else:
+            missing = bytes(len(values))
+        converted = list(map(self.convert, values))
+        self.values.extend(converted)
+        self.missing.extend(missing)
+
+    def Finish(self, numpy=None):
+        if numpy is not None:
+            self.values = numpy.frombuffer(self.values, dtype=numpy.int64 if self.typecode == 'q' else numpy.float64)
+
+class CategoricalColumn:
+    """
+    A column of strings with few distinct values (such as the reader's interned columns), stored as an array of
+    integer codes into a list of the distinct values (the categories). Missing values (None) have the code -1.
+    """
+    def __init__(self):
+        self.codes = array.array('i')
+        self.categories = []
+        self.index = { None: -1 }
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, idx):
+        code = self.codes[idx]
+        return None if code < 0 else self.categories[code]
+
+    def __iter__(self):
+        categories = self.categories + [ None ]
+        for code in self.codes:
+            yield categories[code]
+
+    def GetCodes(self):
+        return self.codes
+
+    def GetCategories(self):
+        return self.categories
+
+    def Extend(self, values):
+        """ Add a sequence of values, raising TypeError (without adding any) if any are not strings or None """
+        index = self.index
+        try:
+            codes = list(map(index.__getitem__, values))
+        except KeyError:
+            if not all(v is None or isinstance(v, str) for v in values):
+                raise TypeError("Categorical values must be strings") from None
+            for value in values:
+                if value not in index:
+                    index[value] = len(self.categories)
+                    self.categories.append(value)
+            codes = list(map(index.__getitem__, values))
+        self.codes.extend(codes)
+
+    def Finish(self, numpy=None):
+        if numpy is not None:
+            self.codes = numpy.frombuffer(self.codes, dtype=numpy.int32)
+
+class ObjectColumn(list):
+    """
+    A column of arbitrary values (such as the lists produced by the 'as-list' extra columns methods)
+    """
+    def Extend(self, values):
+        self.extend(values)
+
+    def Finish(self, **_kwargs):
+        pass
+
+class ColumnTable:
+    """
+    The result of ReadColumns: one column for each entry in the reader's GetOutputColumns(), all of the same length.
+    Columns are retrieved by name with table[name], and len(table) is the number of rows.
+    The reader used is available as table.reader (for example for GetError()).
+    """
+    def __init__(self, reader, types=None):
+        self.reader = reader
+        self.types = types or {}
+        self.names = []
+        self.columns = {}
+        self.row_count = 0
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def GetColumns(self):
+        return self.names
+
+    def AddColumn(self, name):
+        """ Add a column, back-filling it with missing_values for the rows seen so far """
+        kind = self.types.get(name) or self.reader.GetTypes().get(name)
+        if TYPECODES.get(kind) is not None:
+            column = ArrayColumn(TYPECODES[kind])
+        elif kind == 'category' or self.reader.GetInternTable(name) is not None:
+            column = CategoricalColumn()
+        else:
+            column = StringColumn()
+        if self.row_count:
+            self.ExtendColumn(name, column, [ self.reader.missing_values ] * self.row_count)
+        self.names.append(name)
+        self.columns[name] = column
+
+    def ExtendColumn(self, name, column, values):
+        try:
+            column.Extend(values)
+        except TypeError:
+            if not isinstance(column, (StringColumn, CategoricalColumn)):
+                raise
+            # Non-string values (such as lists from 'as-list'), switch to a column of objects
+            replacement = ObjectColumn(column)
+            replacement.Extend(values)
+            self.columns[name] = replacement
+
+    def AddRows(self, rows):
+        """ Add a block of list rows, transposing them into the columns """
+        if not rows:
+            return
+        names = self.reader.GetOutputColumns()
+        for name in names[len(self.names):]:
+            self.AddColumn(name)
+        width = len(names)
+        missing = self.reader.missing_values
+        if any(len(row) != width for row in rows):
+            rows = [ row[:width] + [ missing ] * (width - len(row)) for row in rows ]
+        for name, values in zip(self.names, zip(*rows)):
+            self.ExtendColumn(name, self.columns[name], values)
+        self.row_count += len(rows)
+
+    def Finish(self, use_numpy=None):
+        numpy = _Numpy() if use_numpy or use_numpy is None else None
+        if use_numpy and numpy is None:
+            self.reader.SetError("numpy is not available")
+        for column in self.columns.values():
+            column.Finish(numpy=numpy)
+
+def _AddBlock(table, block):
+    try:
+        table.AddRows(block)
+    except ValueError as e:
+        table.reader.SetError("Failed converting column data: {}".format(e))
+        return False
+    return True
+
+def ReadColumns(path, types=None, block_size=4096, use_numpy=None, **options):
+    """
+    Read a csv file into a ColumnTable: one compact column per entry in GetColumns() (or per usecols entry, when given).
+    The reader options are as for CsvReader (dictify and return_header_row are not used).
+    types is passed to the reader (as for CsvReader), except for the type 'category', and int and float may be given
+    as int or float. Columns of int or float are stored as arrays of numbers (as are columns converted to 'int' or 'float'
+    by the reader, for example with infer_types=True), converted to numpy arrays if use_numpy is True, or is None and
+    numpy is available. Columns interned by the reader (see intern_columns), and columns given the type 'category',
+    are stored as a CategoricalColumn of integer codes plus the list of distinct values.
+    Columns of other types (such as 'date') are stored as lists of their values, and other columns as a text buffer
+    plus offsets.
+    Columns added by extra column handling are back-filled with missing_values.
+    """
+    reader_types = {}
+    for name, kind in (types or {}).items():
+        if kind != 'category':
+            reader_types[name] = READER_TYPES.get(kind, kind)
+    options.update(types=reader_types, dictify=False, return_header_row=False, keep_rows=False)
+    reader = CsvReader(**options)
+    table = ColumnTable(reader, types)
+    block = []
+    for row in reader.Read(path):
+        block.append(row)
+        if len(block) >= block_size:
+            if not _AddBlock(table, block):
+                break
+            block = []
+    else:
+        if _AddBlock(table, block) and reader.header is not None:
+            # Include all of the columns, even if there were no rows
+            for name in reader.GetOutputColumns()[len(table.names):]:
+                table.AddColumn(name)
+    table.Finish(use_numpy=use_numpy)
+    return table
@@ -0,0 +1,191 @@
+"""
+provides CsvIndex, for random access to the rows of a large csv file via an index of byte offsets saved alongside it
+"""
+# pylint: disable=missing-function-docstring
+import os
+import json
+import bisect
+import inspect
+
+from readcsv.csvreader import CsvReader
+
+INDEX_VERSION = 1
+
+# The reader options which affect how lines are counted and where the rows start, or the types stored in the index
+COUNTING_OPTIONS = [ 'sep', 'quotechar', 'skip', 'skip_count', 'skip_empty_lines', 'has_header', 'header',
+                     'return_header_row', 'row_number_style', 'encoding', 'infer_types', 'infer_sample' ]
+
+class CsvIndex:
+    """
+    Random access to the rows of a csv file, by row number.
+    Rows are numbered as the reader numbers them (see row_numbers): by relative_row_number, or by absolute_row_number
+    with row_number_style='absolute'.
+    The byte offset of every Nth data row (every) is recorded, along with the header and the row counters at that point,
+    and saved as JSON in a sidecar file (index_path, defaulting to the path plus '.idx') unless save is False.
+    A saved index is reused as long as the file size and modification time, and the reader options which affect
+    the counting, are unchanged - otherwise it is rebuilt.
+    ReadRange() and GetRow() seek to the nearest recorded offset, and only parse the rows that are needed.
+    The reader options are as for CsvReader (where is not supported, since it would change the row numbering).
+    With infer_types, the types of the columns not given in types are inferred from the start of the file when the index
+    is built, and stored in the index.
+    Lines are split on b'\\n' as with ParallelRead(), so the encoding must be ascii compatible.
+    """
+    def __init__(self, path, every=1000, index_path=None, save=True, **options):
+        if options.get('where'):
+            raise ValueError("where is not supported by CsvIndex")
+        self.path = path
+        self.every = every
+        self.index_path = index_path or path + '.idx'
+        self.options = options
+        self.index = None
+        self.numbers = None
+        self.last_reader = None
+        if not self.Load():
+            self.Build()
+            if save:
+                self.Save()
+
+    def __len__(self):
+        return self.index['rows']
+
+    def GetCountingOptions(self):
+        """ Return the options which the index depends on, in the form in which they are saved """
+        defaults = inspect.signature(CsvReader).parameters
+        counting = { name: self.options.get(name, defaults[name].default) for name in COUNTING_OPTIONS }
+        counting['every'] = self.every
+        if counting['infer_types']:
+            # Only the columns not given in types are inferred
+            counting['typed_columns'] = sorted(self.options.get('types') or {})
+        return json.loads(json.dumps(counting, default=repr))
+
+    def GetFileState(self):
+        st = os.stat(self.path)
+        return { 'size': st.st_size, 'mtime': st.st_mtime_ns }
+
+    def Load(self):
+        """ Load the saved index, returning False if there is none or it does not match the file and options """
+        # pylint: disable=bare-except
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as fh:
+                index = json.load(fh)
+        except:
+            return False
+        if index.get('version') != INDEX_VERSION or index.get('file') != self.GetFileState():
+            return False
+        if index.get('options') != self.GetCountingOptions():
+            return False
+        self.SetIndex(index)
+        return True
+
+    def Save(self):
+        """ Save the index to the sidecar file (returning False if it could not be written) """
+        # pylint: disable=bare-except
+        tmp = self.index_path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as fh:
+                json.dump(self.index, fh)
+            os.replace(tmp, self.index_path)
+        except:
+            return False
+        return True
+
+    def SetIndex(self, index):
+        self.index = index
+        number = 1 if index['options']['row_number_style'] == 'absolute' else 2
+        # The number of the row at each recorded offset
+        self.numbers = [ entry[number] + 1 for entry in index['offsets'] ]
+
+    def Build(self):
+        """ Scan the file, recording the offset and row counters of every Nth data row """
+        reader = CsvReader(**dict(self.options, keep_rows=False))
+        offsets = []
+        sample = []
+        rows = 0
+        state = self.GetFileState()
+        with open(self.path, 'rb') as fh:
+            offset = 0
+            for raw in fh:
+                absolute = reader.absolute_row_number
+                relative = reader.relative_row_number
+                line = reader.FilterLine(reader.DecodeBytes(raw))
+                if line is not None:
+                    if reader.header is None:
+                        reader.HandleHeader(line)
+                    else:
+                        if rows % self.every == 0:
+                            offsets.append([ offset, absolute, relative ])
+                        if reader.infer_types and len(sample) < reader.infer_sample:
+                            sample.append(reader.split_line(line))
+                        reader.relative_row_number += 1
+                        rows += 1
+                offset += len(raw)
+        if sample:
+            reader.InferTypes(sample)
+        self.SetIndex({
+            'version': INDEX_VERSION,
+            'file': state,
+            'options': self.GetCountingOptions(),
+            'header': reader.header,
+            'header_line': reader.header_line,
+            'types': self.InferredTypes(reader) if reader.infer_types else None,
+            'rows': rows,
+            'offsets': offsets,
+        })
+
+    def InferredTypes(self, reader):
+        """ Return the types the reader inferred, leaving out the columns given in the types option """
+        given = self.options.get('types') or {}
+        return { k: v for k, v in reader.GetTypes().items() if isinstance(v, str) and k not in given }
+
+    def GetHeader(self):
+        return self.index['header']
+
+    def GetTypes(self):
+        """ Return the types inferred when the index was built (or None if infer_types was not set) """
+        return self.index['types']
+
+    def Reader(self, entry):
+        """ Create a reader positioned at an index entry, with the header taken from the index """
+        options = dict(self.options, has_header=False, header=self.index['header'], skip_count=0, return_header_row=False)
+        if options.get('infer_types') and self.index['types'] is not None:
+            # The inferred types, with any types given taking precedence
+            types = dict(self.index['types'])
+            types.update(options.get('types') or {})
+            options.update(types=types, infer_types=False)
+        reader = CsvReader(**options)
+        reader.header_line = self.index['header_line']
+        reader.absolute_row_number = entry[1]
+        reader.relative_row_number = entry[2]
+        return reader
+
+    def ReadRange(self, start, stop):
+        """
+        Return a generator which yields the rows numbered from start up to (but not including) stop.
+        The reader used is available afterwards as last_reader (for example for GetError()).
+        """
+        if not self.numbers or stop <= start:
+            return
+        entry = self.index['offsets'][max(bisect.bisect_right(self.numbers, start) - 1, 0)]
+        reader = self.Reader(entry)
+        self.last_reader = reader
+        absolute = reader.row_number_style == 'absolute'
+        with open(self.path, 'rb') as fh:
+            fh.seek(entry[0])
+            for raw in fh:
+                line = reader.DecodeBytes(raw)
+                if (reader.absolute_row_number if absolute else reader.relative_row_number) + 1 < start:
+                    # Count the line without parsing it
+                    if reader.FilterLine(line) is not None:
+                        reader.relative_row_number += 1
+                    continue
+                row = reader.ProcessLine(line)
+                if (reader.absolute_row_number if absolute else reader.relative_row_number) >= stop or reader.error:
+                    return
+                if row is not None:
+                    yield row
+
+    def GetRow(self, number):
+        """ Return the row with the given number, raising IndexError if there is no such row """
+        for row in self.ReadRange(number, number + 1):
+            return row
+        raise IndexError("No row {}".format(number))
@@ -1,11 +1,408 @@
 """ provides the CsvReader class """
 # pylint: disable=missing-function-docstring
+import io
+import os
 import sys
+import stat
+import codecs
+import asyncio
+import queue
+import threading
+import json
+import pickle
+import time
 import re
+import datetime
+import operator
+import itertools
+import csv
+import string
+import glob
+import locale
+import mmap as _mmap
 import importlib
+import functools
+import collections
+import concurrent.futures
 
 from pprint import pformat
 
+TYPE_CONVERTERS = {
+    'int': int,
+    'float': float,
+    'date': datetime.date.fromisoformat,
+    'datetime': datetime.datetime.fromisoformat,
+    'str': None,
+}
+
+# The magic bytes at the start of compressed files, and the stdlib module (with an open() function) for each
+COMPRESSION_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'lzma'),
+]
+
+# The order in which types are tried when inferring column types
+INFERRED_TYPES = [ 'int', 'float', 'date', 'datetime' ]
+
+# With intern_columns='auto', a column is interned if the first block has at most one distinct value per this many rows
+AUTO_INTERN_RATIO = 10
+
+class InternTable(dict):
+    """
+    A table of the distinct values of an interned column, mapping each value to its single shared copy.
+    Once max_size values have been seen, new values are returned as they are, without being added.
+    """
+    def __init__(self, max_size=1 << 16):
+        super().__init__()
+        self.max_size = max_size
+
+    def __missing__(self, value):
+        if len(self) < self.max_size:
+            self[value] = value
+        return value
+
+class Prefix:
+    """
+    A predicate for the where option, matching values which start with the given prefix (or any of a tuple of prefixes).
+    Values of bytes (as with raw_bytes) are matched against the prefix encoded with encoding
+    (the reader uses its own encoding).
+    """
+    def __init__(self, prefix, encoding='utf-8'):
+        self.prefix = prefix
+        self.encoding = encoding
+        if isinstance(prefix, tuple):
+            self.prefix_bytes = tuple(value.encode(encoding) for value in prefix)
+        else:
+            self.prefix_bytes = prefix.encode(encoding)
+
+    def __call__(self, value):
+        if isinstance(value, str):
+            return value.startswith(self.prefix)
+        return isinstance(value, bytes) and value.startswith(self.prefix_bytes)
+
+    def __repr__(self):
+        return "Prefix({})".format(repr(self.prefix))
+
+class Record(tuple):
+    """
+    The base class of the row types produced with row_type='record' (see RecordType).
+    A record is a tuple of the values, which can also be used like a (read only) dict of the columns:
+    row['col'], row.col (for columns which are valid attribute names), row.get(), 'col' in row, keys(), values() and items(),
+    and iterating over a record gives its keys. Integer indexing and slicing are by position.
+    Records compare equal to dicts with the same items.
+    """
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return len(other) == len(self._fields) and all(k in other and other[k] == v for k, v in self.items())
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+    def __repr__(self):
+        return "Record({})".format(dict(self.items()))
+
+    def __reduce__(self):
+        return (_MakeRecord, (self._fields, tuple.__getitem__(self, slice(None))))
+
+    def get(self, key, default=None):
+        idx = self._index.get(key)
+        return default if idx is None else tuple.__getitem__(self, idx)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple.__getitem__(self, slice(None))
+
+    def items(self):
+        return zip(self._fields, tuple.__getitem__(self, slice(None)))
+
+    def _replace(self, **kwargs):
+        """ Return a copy of the record with some values replaced """
+        values = list(tuple.__getitem__(self, slice(None)))
+        for key, val in kwargs.items():
+            values[self._index[key]] = val
+        return type(self)(values)
+
+@functools.lru_cache(maxsize=None)
+def RecordType(fields):
+    """
+    Return a Record subclass for a tuple of field names. Columns whose names are valid attribute names
+    (and do not start with '_' or clash with a method) can also be read as attributes.
+    """
+    fields = tuple(fields)
+    attrs = { '__slots__': (), '_fields': fields, '_index': { name: idx for idx, name in enumerate(fields) } }
+    for idx, name in enumerate(fields):
+        if isinstance(name, str) and name.isidentifier() and not name.startswith('_') and not hasattr(Record, name):
+            attrs.setdefault(name, property(operator.itemgetter(idx)))
+    return type('Record', (Record,), attrs)
+
+def _MakeRecord(fields, values):
+    return RecordType(fields)(values)
+
+class LazyRow:
+    """
+    The rows produced with lazy=True, which hold the line and only split it (applying extra column handling,
+    usecols and type conversion) when a field is first accessed.
+    Fields can be read by column name (row['col'], or row.col for columns which are valid attribute names
+    and do not clash with a method) or by position (row[i], and slices), and raw() returns the line without splitting it.
+    len(), iterating and values() are over the values (as for a list row), and keys(), items() and get() are as for a dict.
+    Lazy rows compare equal to lists of their values and to dicts of their items, and are split when pickled.
+    """
+    __slots__ = ('_line', '_number', '_parse', '_index', '_values')
+
+    def __init__(self, line, number, parse, index=None, values=None):
+        self._line = line
+        self._number = number
+        self._parse = parse
+        self._index = index
+        self._values = values
+
+    def _Parse(self):
+        self._index, self._values = self._parse(self._line)
+        self._parse = None
+        return self._values
+
+    def raw(self):
+        """ Return the line the row was produced from """
+        return self._line
+
+    def __getitem__(self, key):
+        values = self._values if self._values is not None else self._Parse()
+        if isinstance(key, str):
+            idx = self._index[key]
+            return self._number if idx is None else values[idx]
+        return values[key]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __len__(self):
+        return len(self._values if self._values is not None else self._Parse())
+
+    def __iter__(self):
+        return iter(self._values if self._values is not None else self._Parse())
+
+    def __contains__(self, key):
+        if self._values is None:
+            self._Parse()
+        return key in self._index
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        if isinstance(other, LazyRow):
+            other = other.values()
+        return self.values() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "LazyRow({})".format(repr(self._line))
+
+    def __reduce__(self):
+        values = self._values if self._values is not None else self._Parse()
+        return (LazyRow, (self._line, self._number, None, self._index, values))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (KeyError, IndexError):
+            return default
+
+    def keys(self):
+        if self._values is None:
+            self._Parse()
+        return list(self._index)
+
+    def values(self):
+        return list(self._values if self._values is not None else self._Parse())
+
+    def items(self):
+        return [ (key, self[key]) for key in self.keys() ]
+
+class _LineFeed:
+    """
+    An iterator which returns the line it was last given, once, so that a single csv module reader
+    can split lines one at a time (see CsvReader.SplitLineStdlib)
+    """
+    def __init__(self):
+        self.line = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.line
+        if line is None:
+            raise StopIteration
+        self.line = None
+        return line
+
+class _ThreadedReader:
+    """
+    Reads chunks of bytes from a binary file handle in a background thread, holding at most max_chunks chunks which
+    have not yet been read, so that decompression can overlap with parsing.
+    Provides read() (returning decoded text, with line endings converted) and close() for ReadLines().
+    """
+    def __init__(self, fh, read_size, encoding, max_chunks=4):
+        self.fh = fh
+        self.read_size = read_size
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.carriage_return = False
+        self.chunks = queue.Queue(max_chunks)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.Run, daemon=True)
+        self.thread.start()
+
+    def Run(self):
+        # pylint: disable=broad-except
+        try:
+            while not self.stopped.is_set():
+                chunk = self.fh.read(self.read_size)
+                self.Put(chunk)
+                if not chunk:
+                    break
+        except Exception as e:
+            self.Put(e)
+
+    def Put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def read(self, _size=None):
+        if self.stopped.is_set():
+            return ""
+        item = self.chunks.get()
+        if isinstance(item, Exception):
+            raise item
+        if not item:
+            self.stopped.set()
+        text = self.decoder.decode(item, final=not item)
+        if self.carriage_return:
+            text = "\r" + text
+        # Hold back a trailing '\r' in case it is followed by '\n' in the next chunk
+        self.carriage_return = text.endswith("\r") and bool(item)
+        if self.carriage_return:
+            text = text[:-1]
+        return text.replace("\r\n", "\n") or ("" if not item else self.read())
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+def _RangeReader(options, header):
+    """ Create a reader, from the given constructor options, for parsing a byte range of a file with the given header """
+    options = dict(options, has_header=False, header=list(header), expected_header=None, skip_count=0,
+                   return_header_row=False, keep_rows=False, raise_error=False, msg=None)
+    return CsvReader(**options)
+
+def _Picklable(value):
+    """ Whether a value can be pickled, to be passed to a worker process """
+    try:
+        pickle.dumps(value)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        # Lambdas and local functions can not be pickled
+        return False
+    return True
+
+def _RangeLines(reader, path, start, end):
+    """ Read the lines within a byte range of a file """
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    lines = reader.DecodeBytes(data).split(reader.newline)
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+def _ReadRange(path, start, end, options, header):
+    """
+    Parse the lines within a byte range of a file with a reader configured from the given constructor options,
+    using the given header (the range must not include the header or any lines to be skipped with skip_count).
+    Runs within a worker process for CsvReader.ParallelRead
+    """
+    # pylint: disable=bare-except
+    reader = _RangeReader(options, header)
+    rows = []
+    try:
+        for block in reader.ProcessBlocks(_RangeLines(reader, path, start, end)):
+            rows.extend(block)
+    except:
+        reader.error = "Failed processing line:" + (reader.failed_line or "")
+    return {
+        'rows': rows,
+        'columns': reader.columns,
+        'types': reader.GetTypes(),
+        'lines': reader.absolute_row_number + 1,
+        'relative': reader.relative_row_number + 1,
+        'filtered': reader.filtered_count,
+        'stats': reader.stats,
+        'error': reader.error,
+    }
+
+def _ReadFile(path, options):
+    """
+    Read a whole file with a reader configured from the given constructor options.
+    Runs within a worker thread or process for CsvReader.ReadMany
+    """
+    # pylint: disable=bare-except
+    reader = CsvReader(**options)
+    rows = []
+    try:
+        for block in reader.ReadBlocks(path):
+            rows.extend(block)
+    except:
+        reader.error = "Failed reading file {}".format(path)
+    return {
+        'rows': rows,
+        'header': reader.header,
+        'columns': reader.columns,
+        'lines': reader.absolute_row_number + 1,
+        'relative': reader.relative_row_number + 1,
+        'filtered': reader.filtered_count,
+        'stats': reader.stats,
+        'error': reader.error,
+    }
+
 class CsvReader:
     # pylint: disable=too-many-instance-attributes
     """
@@ -22,6 +419,14 @@ class CsvReader:
     dictification:
       If dictify is True, the returned rows will be a dict of key/value pairs rather than a list.
       If dict_type is True, then that class will be instantatiated rather than an AttrDict
+      If row_type is 'record', each row is instead built with a single constructor call as an immutable Record (implies dictify),
+      a tuple subclass generated from the columns (and regenerated when extra columns are added), which supports
+      key and attribute access like an AttrDict (see Record).
+      If lazy is True, each row is instead a LazyRow holding the line, which is only split (with extra column handling,
+      usecols and type conversion) when a field is first accessed, so rows which are only forwarded (see raw())
+      or discarded are never tokenized. Lazy rows support both list and dict access (dictify and dict_type are not used),
+      and where predicates are still applied while reading. Columns generated by extra column handling, and type
+      conversion errors, only appear when the rows with them are accessed. lazy can not be used with row_type or infer_types.
 
     extra columns:
       If extra columns are found, the header line will not be modified, but the header will be updated
@@ -44,6 +449,90 @@ class CsvReader:
       by the key specified by that string.
       For example row_numbers='_row',dictify=True   will produce rows like {'_row':0,...}
       if row_number_style is 'absolute' or 'relative' then the row number produced will either include, or ignore, any skipped lines
+
+    column projection:
+      If usecols is set to a list of column names or (0-based) indices, each row contains only those columns, in that order
+      (and the header row returned is projected in the same way). Names are resolved against the header.
+      When every projected column is an ordinary header column, lines are only split as far as the last projected column,
+      and extra column handling is skipped (so columns which would be generated from extra data are not added to GetColumns()).
+      If the projection includes columns beyond the header (generated columns, or the 'store' column), or the last header
+      column with 'append-last', each line is split fully and extra column handling is applied before projecting.
+      GetOutputColumns() returns the names of the columns in each row.
+
+    row filtering:
+      If where is set, it maps column names to a predicate, and only rows for which every predicate matches are produced.
+      A predicate is either a value (the field must be equal to it), a set or frozenset (the field must be a member),
+      Prefix(prefix) (the field must start with the prefix), or a function taking the field and returning True to keep the row.
+      Predicates are applied to the raw field values of the line (before extra column handling and type conversion),
+      which is only split as far as the last column involved; rows which do not match are discarded before any further
+      processing, and are not counted as rows (for relative row numbers). Short rows are tested with missing_values.
+      A column which is not in the header sets an error, and every row is discarded (the predicate is not called).
+      GetFilteredCount() returns the number of rows discarded.
+
+    row processing:
+      The per-row processing is specialised for the reader's configuration when it is constructed (and again once the header
+      is known), so that only the steps needed are done for each row. If attributes of the reader are modified directly,
+      Compile() must be called for the changes to take effect.
+      When dictifying, rows with fewer values than there are columns are padded with missing_values.
+
+    parallel reading:
+      ParallelRead() splits a file into byte ranges aligned to line boundaries and parses them in a pool of processes,
+      yielding the rows in their original order. The leading lines (skip_count and the header) are processed first
+      in the calling process, and each range is then parsed by a reader with the same constructor options.
+      Lines are decoded using the encoding given in the constructor (the locale's preferred encoding by default).
+
+    streaming:
+      Read() reads the file incrementally in chunks of read_size characters, so memory use does not grow with the file size.
+      If mmap is True, Read() memory-maps the file and decodes blocks of lines directly from the mapping,
+      rather than reading the data into an intermediate buffer first (for regular files on local disk).
+      If keep_rows is True, every row produced is also retained in self.rows (the default is to not retain them).
+      Files compressed with gzip, bzip2 or xz are detected by their leading bytes and decompressed as they are read
+      (mmap and ParallelRead() are not used for them). If decompress_thread is True, decompression is done in a background
+      thread which stays at most a few chunks of read_size ahead of the parsing.
+      ReadAsync() reads from an asyncio.StreamReader (or any async iterable of bytes) as an async generator, decoding and
+      parsing each chunk as it arrives, optionally in an executor so that large chunks do not block the event loop.
+
+    binary mode:
+      If binary is True, files are read as bytes and each line is tokenized as bytes (by SplitBytes), and only the fields
+      which are returned are decoded: just the projected fields with usecols, and just the tested fields for where.
+      If raw_bytes is True (which implies binary) the fields are returned as bytes, and only typed columns are decoded
+      (int and float convert bytes directly, and 'str' columns are just decoded). The header is always decoded.
+      ProcessLines() and ProcessData() take bytes in binary mode.
+
+    type conversion:
+      By default every value is returned as a string.
+      If types is set, it maps column names to a type, which is either one of 'int', 'float', 'date', 'datetime' or 'str',
+      or a function taking a string and returning the converted value.
+      If infer_types is True, the types of any columns not given in types are inferred from the first infer_sample data rows,
+      choosing the first of int, float, date or datetime that can convert every non-empty sampled value (or str otherwise).
+      Conversion is done for blocks of block_size lines at a time, one column at a time.
+      Empty values in a typed column are replaced with missing_values.
+      If a value cannot be converted, the type_errors policy is applied:
+        'error' (the default) sets the error (see error handling) and stops processing,
+        'missing' replaces the value with missing_values, and 'keep' leaves the original string.
+      With 'missing' and 'keep', a warning is output (unless quiet is set) and the count is available from GetConversionErrors().
+      If intern_columns is a list of string columns, each of their values is replaced by a single shared copy from
+      a per-column InternTable (see GetInternTable), so retained rows hold one string per distinct value.
+      If it is 'auto', the string columns with at most one distinct value per AUTO_INTERN_RATIO rows in the first block are interned.
+
+    tokenizing backend:
+      If backend is 'python' (the default), lines are split by SplitLine, which supports the lenient quoting rules
+      (quotes may appear anywhere within a field and simply toggle quoting on and off).
+      If backend is 'stdlib', lines are split by the C-implemented csv module (quotes are only special at the start
+      of a field, and doubled quotes within a quoted field produce a single quote).
+      If backend is 'auto', the first backend_sample lines are split by both, and the csv module is used for the rest
+      of the input only if every sampled line produced the same result. The backend then changes part way through the
+      input, so lines after the sample which the backends split differently (such as a doubled quote "" within
+      a quoted field, which SplitLine drops and the csv module reads as a quote) are split as the csv module does.
+      Header handling, extra column handling and dictification are the same for all backends.
+
+    instrumentation:
+      If stats is True, the reader counts the lines, bytes, rows, skipped and filtered lines, quoted and unquoted lines,
+      and extra column events, and times each stage of the pipeline (see GetStats()).
+      The per-row stages are timed for one call in stats_sample, to keep the overhead low, and the total time is estimated.
+      If stats_callback is given, it is called with GetStats() after each block in which another stats_every rows were produced.
+      When stats is False the compiled functions are not wrapped, so there is no overhead.
+      Statistics are gathered by the block methods (Read(), ProcessLines(), and the batch methods), and merged from the workers by ParallelRead().
     """
     def __init__(self,
                  sep=',',
@@ -65,9 +554,35 @@ class CsvReader:
                  row_number_style='absolute',
                  quiet=False,
                  raise_error=False,
-                 msg=None
+                 msg=None,
+                 keep_rows=False,
+                 read_size=1024*1024,
+                 backend='python',
+                 backend_sample=100,
+                 encoding=None,
+                 mmap=False,
+                 types=None,
+                 infer_types=False,
+                 infer_sample=100,
+                 type_errors='error',
+                 block_size=1000,
+                 usecols=None,
+                 where=None,
+                 row_type=None,
+                 decompress_thread=False,
+                 binary=False,
+                 raw_bytes=False,
+                 stats=False,
+                 stats_callback=None,
+                 stats_every=100000,
+                 stats_sample=100,
+                 lazy=False,
+                 intern_columns=None
                 ):
         # pylint: disable=too-many-arguments,too-many-locals,too-many-statements
+        # The constructor options, for creating equivalent readers (see ParallelRead)
+        self.options = dict(locals())
+        del self.options['self']
         self.quotechar = quotechar
         self.sep = sep
         self.quiet = quiet
@@ -129,19 +644,36 @@ class CsvReader:
         self.missing_values = missing_values
 
         self.rows = []
+        self.follow_position = None
+        self.file_errors = {}
+        self.keep_rows = keep_rows
+        self.read_size = read_size
+        self.use_mmap = mmap
+        self.decompress_thread = decompress_thread
         self.row_number_style = row_number_style
         self.row_numbers = row_numbers
         self.absolute_row_number = -1
         self.relative_row_number = -1
         self.skip = skip
+        self.skip_match = re.compile(skip).match if skip is not None else None
         self.skip_count = skip_count
         self.skip_empty_lines = skip_empty_lines
 
         self.comment_char = comment_char
 
+        if row_type not in (None, 'dict', 'record'):
+            raise ValueError("Unsupported row_type {}".format(row_type))
+        self.row_type = row_type
+        if row_type == 'record':
+            dictify = True
+            dict_type = dict_type or dict
         self.dictify = dictify
 
-        if dictify and dict_type is None:
+        if lazy and (row_type is not None or infer_types or intern_columns == 'auto'):
+            raise ValueError("lazy can not be combined with row_type, infer_types or intern_columns='auto'")
+        self.lazy = lazy
+
+        if dictify and dict_type is None and not lazy:
             # use importlib for geting the AttrDict type, so that it is a soft dependency only
             try:
                 # pylint: disable=bare-except
@@ -155,121 +687,867 @@ class CsvReader:
 
         self.error = None
 
+        self.encoding = encoding
+
+        self.types = dict(types) if types else {}
+        self.infer_types = infer_types
+        self.infer_sample = infer_sample
+        self.type_errors = type_errors
+        self.block_size = block_size
+        self.converters = None
+        self.conversion_errors = 0
+        self.failed_line = None
+
+        if intern_columns is not None and intern_columns != 'auto':
+            intern_columns = list(intern_columns)
+        self.intern_columns = intern_columns
+        self.intern_tables = {}
+        self.interners = None
+
+        self.usecols = list(usecols) if usecols is not None else None
+        self.out_columns = None
+
+        self.where = dict(where) if where else None
+        self.filtered_count = 0
+        if type_errors not in [ 'error', 'missing', 'keep' ]:
+            self.SetError("Bad value {} for type_errors".format(type_errors))
+        for name, spec in self.types.items():
+            if not callable(spec) and spec not in TYPE_CONVERTERS:
+                self.SetError("Bad type {} for column {}".format(spec, name))
+
+        self.stats = self.NewStats() if stats else None
+        self.stats_callback = stats_callback
+        self.stats_every = stats_every
+        self.stats_sample = stats_sample
+
+        self.backend = backend
+        self.backend_sample = backend_sample
+        self.backend_remaining = backend_sample
+        self.active_backend = None
+        self.split_line = self.SplitLine
+        self.csv_reader = None
+        self.csv_feed = None
+        self.csv_line_reader = None
+        if backend not in [ 'python', 'stdlib', 'auto' ]:
+            self.SetError("Bad value {} for backend".format(backend))
+        elif backend != 'python':
+            if len(sep) != 1 or (quotechar and len(quotechar) != 1):
+                if backend == 'stdlib':
+                    self.SetError("The stdlib backend requires a single character sep and quotechar")
+            elif quotechar:
+                self.csv_reader = functools.partial(csv.reader, delimiter=sep, quotechar=quotechar, strict=False)
+            else:
+                self.csv_reader = functools.partial(csv.reader, delimiter=sep, quoting=csv.QUOTE_NONE, strict=False)
+        if self.csv_reader is None:
+            self.active_backend = 'python'
+        else:
+            self.csv_feed = _LineFeed()
+            self.csv_line_reader = self.csv_reader(self.csv_feed)
+            if backend == 'stdlib':
+                self.active_backend = 'stdlib'
+                self.split_line = self.SplitLineStdlib
+            else:
+                self.split_line = self.SplitLineAuto
+
+        self.binary = binary or raw_bytes
+        self.raw_bytes = raw_bytes
+        self.newline = b'\n' if self.binary else '\n'
+        if self.binary:
+            encoding = self.field_encoding = self.GetEncoding()
+            self.sep_bytes = sep.encode(encoding)
+            self.quotechar_bytes = quotechar.encode(encoding) if quotechar else quotechar
+            # Testing for a single byte is much faster as an int
+            self.quotechar_test = self.quotechar_bytes[0] if quotechar and len(self.quotechar_bytes) == 1 else self.quotechar_bytes
+            if skip is not None:
+                self.skip_match = re.compile(skip.encode(encoding)).match
+            if self.csv_reader is not None and backend == 'stdlib':
+                self.SetError("The stdlib backend can not be used with binary")
+            self.active_backend = 'python'
+            self.split_line = self.SplitBytes if raw_bytes else self.SplitLineBinary
+
+        self.Compile()
+
     def __str__(self):
         return "CSV file currently with {} rows and {} columns (header={})".format(len(self.rows), len(self.header), pformat(self.header))
 
-    def SplitLine(self, line):
-        # pylint: disable=missing-function-docstring,too-many-statements
-        beg = 0
-        quote_idx = line.find(self.quotechar)
-        if quote_idx < 0:
-            for x in line.split(self.sep):
-                yield x
-            return
+    def SplitLine(self, line, maxfields=None):
+        """
+        Split a line into a list of fields.
+        Quote characters toggle quoting on and off wherever they appear and are removed from the output,
+        and separators within a quoted section are kept as part of the field.
+        Each line is scanned once, by splitting on the quote character first and then splitting only
+        the unquoted sections on the separator.
+        If maxfields is given, scanning may stop once that many fields have been found, and any fields
+        after the first maxfields are not accurate (the rest of the line may be left unsplit, or dropped).
+        """
+        sep = self.sep
+        qc = self.quotechar
+        if not qc or qc not in line:
+            if maxfields is not None:
+                return line.split(sep, maxfields)
+            return line.split(sep)
+
+        fields = []
+        keep = ""
+        inquote = False
+        for part in line.split(qc):
+            if maxfields is not None and len(fields) >= maxfields:
+                return fields
+            if inquote:
+                # Quoted section, separators are part of the field
+                keep += part
+            else:
+                pieces = part.split(sep)
+                if len(pieces) > 1:
+                    # The first piece completes the field being accumulated, the last piece begins a new one
+                    fields.append(keep + pieces[0])
+                    keep = pieces.pop()
+                    fields.extend(pieces[1:])
+                else:
+                    keep += part
+            inquote = not inquote
+        fields.append(keep)
+        return fields
+
+
+    def SplitBytes(self, line, maxfields=None):
+        """
+        Split a line of bytes into a list of bytes fields, in the same way as SplitLine (for binary mode).
+        """
+        sep = self.sep_bytes
+        qc = self.quotechar_bytes
+        if not qc or self.quotechar_test not in line:
+            if maxfields is not None:
+                return line.split(sep, maxfields)
+            return line.split(sep)
 
-        sz = len(line)
-        beg = 0
+        fields = []
+        keep = b""
         inquote = False
+        for part in line.split(qc):
+            if maxfields is not None and len(fields) >= maxfields:
+                return fields
+            if inquote:
+                keep += part
+            else:
+                pieces = part.split(sep)
+                if len(pieces) > 1:
+                    fields.append(keep + pieces[0])
+                    keep = pieces.pop()
+                    fields.extend(pieces[1:])
+                else:
+                    keep += part
+            inquote = not inquote
+        fields.append(keep)
+        return fields
+
+    def SplitLineBinary(self, line, maxfields=None):
+        """
+        Split a line of bytes into a list of decoded fields (for binary mode, when every field is needed).
+        Decoding the whole line at once is faster than decoding each field.
+        """
+        return self.SplitLine(line.decode(self.field_encoding), maxfields)
+
+    def SplitLineStdlib(self, line):
+        """
+        Split a line into a list of fields using the csv module
+        (falling back to SplitLine for lines that the csv module rejects, such as overly long fields).
+        Lines without a quote character are simply split on the separator, which gives the same result faster,
+        and the other lines are passed through the same csv module reader rather than creating one for every line.
+        """
+        qc = self.quotechar
+        if not qc or qc not in line:
+            return line.split(self.sep)
+        self.csv_feed.line = line
+        try:
+            return next(self.csv_line_reader, [''])
+        except csv.Error:
+            return self.SplitLine(line)
+
+    def SplitLinesStdlib(self, lines):
+        """
+        Split a list of lines into a list of lists of fields, as SplitLineStdlib does for each line,
+        passing all of the lines which contain a quote character through a single csv module reader
+        """
         sep = self.sep
         qc = self.quotechar
-        keep = ""
-        while True:
-            next_sep = line.find(sep, beg)
-            next_quote = line.find(qc, beg)
-            #msg("{} of {} got next {}={}, next {}={}", beg, sz, sep, next_sep, qc, next_quote)
-            if beg >= sz:
-                yield keep
-                return
-            if inquote and next_sep == beg: # Comma within quoted section, accumulate it
-                keep += sep
-                beg += 1
-                continue
-            if next_sep == beg: # Comma starting next field. Return anything accumulated
-                yield keep
-                keep = ""
-                beg +=1
-                continue
-            if inquote and next_quote == beg: # End quoted section, continue looking for sep
-                keep += line[beg:next_quote]
-                beg +=1
-                inquote = False
-                continue
-            if next_quote == beg: # Begin quoted section, skip this single quote.
-                inquote = True
-                beg +=1
-                continue
-            if inquote and next_quote > beg: # Accumulate up to the next quote, if one found
-                keep += line[beg:next_quote]
-                beg = next_quote + 1 # skip this quote
-                inquote = False
-                continue
-            if inquote and next_quote <= beg: # In quoted section,but no more quotes avail.
-                keep += line[beg:] # Accumlate everything to end of line
-                yield keep
-                keep = ""
-                return # Finish
-            if 0 < next_sep < next_quote:  # From this point on, inquote==False
-                keep += line[beg:next_sep]  # There is another quote, but next comma is closer than next quote
-                beg = next_sep + 1
-                yield keep
-                keep = ""
-                continue
-            if  next_sep > 0 and next_sep > next_quote >= beg:
-                # Accumulate up to the quote and begin quoted section.
-                keep += line[beg:next_quote]
-                beg = next_quote + 1
-                inquote = True
-                continue
-            if next_sep > 0 and next_quote <=beg:
-                keep += line[beg:next_sep]
-                beg = next_sep + 1
-                yield keep
-                keep = ""
-                continue
-            if next_sep < 0 <= next_quote:
-                keep += line[beg:next_quote]
-                beg = next_quote + 1
-                inquote = True
-                continue
-            if next_sep < 0 and next_quote < 0:
-                # Neither separator or quote have been seen.
-                # Grab to the end of the line, and finish.
-                keep += line[beg]
-                yield keep
-                keep = ""
-                return
-            self.msg("This should never happen")
-            return
-        return
+        quoted = [ line for line in lines if qc in line ] if qc else None
+        if not quoted:
+            return [ line.split(sep) for line in lines ]
+        split = iter(self.SplitQuotedStdlib(quoted))
+        return [ next(split) if qc in line else line.split(sep) for line in lines ]
+
+    def SplitQuotedStdlib(self, lines):
+        """
+        Split a list of lines with a single csv module reader.
+        The reader continues a quoted field which is still open at the end of a line onto the next line,
+        so the reader's line_num is checked after each row: such a line is split on its own (see SplitLineStdlib),
+        as is a line that the reader rejects, and a new reader carries on from the following line.
+        """
+        rows = []
+        count = len(lines)
+        remaining = iter(lines)
+        source = remaining
+        while len(rows) < count:
+            start = len(rows)
+            reader = self.csv_reader(source)
+            try:
+                for fields in reader:
+                    if reader.line_num != len(rows) - start + 1:
+                        break
+                    rows.append(fields)
+            except csv.Error:
+                pass
+            if len(rows) < count:
+                failed = len(rows)
+                rows.append(self.SplitLineStdlib(lines[failed]))
+                # Carry on from the next line, including any further lines the reader has already read
+                source = itertools.chain(lines[failed + 1:start + reader.line_num], remaining)
+        return rows
 
+    def SplitLineAuto(self, line):
+        """
+        Split a line with SplitLine while comparing the result against the csv module.
+        Once backend_sample lines have produced the same result, the csv module is used for all further lines
+        (which may be split differently than SplitLine would have), and if any line differs, SplitLine is used
+        for all further lines.
+        """
+        if self.active_backend is not None:
+            # Decided earlier in a block which is still being split with this function
+            return self.split_line(line)
+        fields = self.SplitLine(line)
+        if self.SplitLineStdlib(line) != fields:
+            self.active_backend = 'python'
+            self.split_line = self.SplitLine
+            self.Compile()
+        else:
+            self.backend_remaining -= 1
+            if self.backend_remaining <= 0:
+                self.active_backend = 'stdlib'
+                self.split_line = self.SplitLineStdlib
+                self.Compile()
+        return fields
+
+    def GetBackend(self):
+        """ Return the tokenizing backend in use ('python' or 'stdlib'), or None if 'auto' has not decided yet """
+        return self.active_backend
 
     def AddRow(self, row):
-        self.rows.append(row)
+        if self.keep_rows:
+            self.rows.append(row)
+
+    def ReadLines(self, fh):
+        """
+        Yield the lines from an open text file handle, reading it in chunks of read_size characters
+        so that only one chunk (plus any partial line) is held in memory at a time.
+        """
+        read_size = self.read_size
+        newline = self.newline
+        pending = newline[:0]
+        while True:
+            chunk = fh.read(read_size)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(newline)
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
+
+    def ReadMapped(self, fh):
+        """
+        Yield the lines from an open binary file handle, by memory-mapping the file and decoding
+        blocks of about read_size bytes (ending on a line boundary) directly from the mapping.
+        """
+        size = os.fstat(fh.fileno()).st_size
+        if not size:
+            return
+        encoding = self.GetEncoding()
+        read_size = self.read_size
+        with _mmap.mmap(fh.fileno(), 0, access=_mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            pos = 0
+            while pos < size:
+                end = mm.rfind(b'\n', pos, pos + read_size) + 1
+                if end <= pos:
+                    # No line ending within this block, so extend it to the end of the line
+                    end = mm.find(b'\n', pos + read_size) + 1 or size
+                if self.binary:
+                    lines = mm[pos:end].split(b'\n')
+                else:
+                    lines = str(view[pos:end], encoding).split('\n')
+                pos = end
+                if not lines[-1]:
+                    lines.pop()
+                yield from lines
 
     def Read(self, f):
+        """
+        Read a file, returning a generator which yields each row.
+        Lines are processed in blocks of block_size lines (see ProcessBlock)
+        """
+        for rows in self.ReadBlocks(f):
+            yield from rows
+
+    def ReadBatches(self, f, batch_size=None):
+        """
+        Read a file, returning a generator which yields lists of batch_size rows (the last may be shorter).
+        batch_size defaults to block_size.
+        """
+        return self.Batches(self.ReadBlocks(f), batch_size or self.block_size)
+
+    def ReadBlocks(self, f):
+        """ Read a file, returning a generator which yields the list of rows produced by each block of lines """
         self.error = None
         err_generated = None
         try:
             # pylint: disable=bare-except
-            with open(f, 'r') as fh:
-                for line in fh.readlines():
+            # The file is only opened once, so that a pipe can be read: the compression is detected by peeking at it
+            raw = open(f, 'rb')
+            compression = self.GetCompression(raw)
+            if compression is not None:
+                module = importlib.import_module(compression)
+                if self.binary:
+                    fh = module.open(raw, 'rb')
+                elif self.decompress_thread:
+                    # Only the decompression (which releases the GIL) is done in the thread, decoding is done here
+                    fh = _ThreadedReader(module.open(raw, 'rb'), self.read_size, self.GetEncoding())
+                else:
+                    fh = module.open(raw, 'rt', encoding=self.encoding)
+                lines = self.ReadLines(fh)
+            elif self.use_mmap and stat.S_ISREG(os.fstat(raw.fileno()).st_mode):
+                fh = raw
+                lines = self.ReadMapped(fh)
+            elif self.binary:
+                fh = raw
+                lines = self.ReadLines(fh)
+            else:
+                fh = io.TextIOWrapper(raw, encoding=self.encoding)
+                lines = self.ReadLines(fh)
+            with raw, fh:
+                blocks = self.Blocks(lines)
+                if self.stats is not None:
+                    blocks = self.TimedBlocks(blocks)
+                for block in blocks:
                     try:
                         # pylint: disable=bare-except
-                        row = self.ProcessLine(line)
-                        if self.error:
-                            err_generated = None
-                            break
-                        if row is not None:
-                            yield row
+                        rows = self.ProcessBlock(block)
                     except:
-                        err_generated = "Failed processing line:" + line
+                        if self.raise_error and self.error:
+                            # An error set with SetError, which raised it
+                            raise
+                        err_generated = "Failed processing line:" + (self.failed_line or "")
                         break
+                    if rows:
+                        if self.stats is not None:
+                            start = time.perf_counter()
+                            yield rows
+                            self.TimeStage('consumer', time.perf_counter() - start)
+                        else:
+                            yield rows
+                    if self.error:
+                        break
+        except GeneratorExit:
+            raise
         except:
+            if self.raise_error and self.error:
+                raise
             err_generated = "Failed reading file {}".format(f)
 
         if err_generated:
             self.SetError(err_generated)
 
+    async def ReadAsync(self, source, executor=None, executor_min_size=64*1024):
+        """
+        Read from an asyncio.StreamReader (anything with an async read(n) method, read in chunks of read_size bytes)
+        or an async iterable of bytes, returning an async generator which yields each row.
+        Lines are processed as for ProcessLine (with the same header, skip and extra column handling) as each chunk arrives.
+        If executor is given, chunks of at least executor_min_size bytes are parsed using loop.run_in_executor()
+        (executor may be a concurrent.futures.Executor, or True for the loop's default executor).
+        """
+        # pylint: disable=bare-except
+        self.error = None
+        loop = asyncio.get_running_loop()
+        if executor is True:
+            executor = None
+        elif executor is None:
+            executor_min_size = None
+        if self.binary:
+            decode = lambda data, final=False: data
+        else:
+            decode = codecs.getincrementaldecoder(self.GetEncoding())().decode
+        newline = self.newline
+        crlf = b'\r\n' if self.binary else '\r\n'
+        pending = newline[:0]
+        chunks = self.AsyncChunks(source)
+        while not self.error:
+            try:
+                data = await chunks.__anext__()
+            except StopAsyncIteration:
+                data = None
+            except asyncio.CancelledError:
+                raise
+            except:
+                self.SetError("Failed reading stream")
+                break
+            if data is None:
+                lines = (pending + decode(b"", final=True)).replace(crlf, newline).split(newline)
+                if not lines[-1]:
+                    lines.pop()
+            else:
+                lines = (pending + decode(data)).replace(crlf, newline).split(newline)
+                pending = lines.pop()
+            if executor_min_size is not None and len(data or b"") >= executor_min_size:
+                rows = await loop.run_in_executor(executor, self.ProcessChunk, lines)
+            else:
+                rows = self.ProcessChunk(lines)
+            for row in rows:
+                yield row
+            if data is None:
+                break
+
+    async def AsyncChunks(self, source):
+        """ Yield the chunks of bytes from a stream reader or async iterable of bytes """
+        if hasattr(source, 'read'):
+            while True:
+                data = await source.read(self.read_size)
+                if not data:
+                    return
+                yield data
+        else:
+            async for data in source:
+                if data:
+                    yield data
+
+    def ProcessChunk(self, lines):
+        """ Process a list of lines in blocks, returning the list of all of the rows produced """
+        # pylint: disable=bare-except
+        rows = []
+        try:
+            for block in self.ProcessBlocks(lines):
+                rows.extend(block)
+        except:
+            if self.raise_error and self.error:
+                # An error set with SetError, which raised it
+                raise
+            self.SetError("Failed processing line:" + (self.failed_line or ""))
+        return rows
+
+    @staticmethod
+    def GetCompression(f):
+        """
+        Return the name of the module for decompressing a file (by its leading bytes), or None if it is not compressed.
+        f is a path, or an open buffered binary file, whose leading bytes are peeked at without being consumed.
+        A path which is not a regular file (such as a pipe) is not opened, and is treated as not compressed.
+        """
+        if hasattr(f, 'peek'):
+            magic = f.peek(6)[:6]
+        elif not stat.S_ISREG(os.stat(f).st_mode):
+            return None
+        else:
+            with open(f, 'rb') as fh:
+                magic = fh.read(6)
+        for prefix, module in COMPRESSION_MAGIC:
+            if magic.startswith(prefix):
+                return module
+        return None
+
+    @staticmethod
+    def Batches(blocks, batch_size):
+        """ Regroup an iterable of lists of rows into lists of batch_size rows (the last may be shorter) """
+        batch = []
+        for rows in blocks:
+            batch.extend(rows)
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                del batch[:batch_size]
+        if batch:
+            yield batch
+
+    def Follow(self, f, interval=1.0, idle_timeout=None):
+        """
+        Follow a file which is being appended to, returning a generator which yields a list of the new rows from each Poll()
+        which found any, sleeping for interval seconds whenever there is no new data (no new complete lines were read).
+        It stops when an error is set, or once there has been no new data for idle_timeout seconds (if given).
+        The reader state can be saved between lists (see SaveState) so that a restarted reader resumes where it left off.
+        """
+        idle_since = time.monotonic()
+        while not self.error:
+            before = self.follow_position and dict(self.follow_position)
+            rows = self.Poll(f)
+            if self.follow_position != before:
+                # New lines were read, even if they were all skipped or filtered out
+                idle_since = time.monotonic()
+                if rows:
+                    yield rows
+                continue
+            if self.error or (idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout):
+                return
+            time.sleep(interval)
+
+    def Poll(self, f):
+        """
+        Process the complete lines appended to a file since the last Poll() (or since the position in a restored state),
+        reading at most about read_size bytes, and return the list of rows produced.
+        An incomplete last line is left until it has been completed.
+        If the file has been truncated, or replaced (it has a different inode, as when a log is rotated),
+        it is read again from the beginning, starting again with the header and row counters (see ResetFile).
+        A missing file is treated as having no new data.
+        """
+        # pylint: disable=bare-except
+        position = self.follow_position
+        try:
+            st = os.stat(f)
+        except FileNotFoundError:
+            return []
+        if position is None or position['inode'] != st.st_ino or position['device'] != st.st_dev or st.st_size < position['offset']:
+            if position is not None:
+                self.ResetFile()
+            position = self.follow_position = { 'offset': 0, 'inode': st.st_ino, 'device': st.st_dev }
+        if st.st_size == position['offset']:
+            return []
+        try:
+            with open(f, 'rb') as fh:
+                fh.seek(position['offset'])
+                data = fh.read(self.read_size)
+                while data and b'\n' not in data:
+                    more = fh.read(self.read_size)
+                    if not more:
+                        return []
+                    data += more
+        except:
+            self.SetError("Failed reading file {}".format(f))
+            return []
+        end = data.rfind(b'\n') + 1
+        if not end:
+            return []
+        lines = self.DecodeBytes(data[:end]).split(self.newline)[:-1]
+        rows = self.ProcessChunk(lines)
+        position['offset'] += end
+        return rows
+
+    def ResetFile(self):
+        """
+        Prepare to read a file again from the start: the header (unless given), columns, skip_count and row counters,
+        and the types (which are resolved against the new header, and inferred again if infer_types is set)
+        """
+        header = self.options['header']
+        if header is not None:
+            self.header = header
+            self.columns = [] + header
+        elif self.has_header:
+            self.header = None
+            self.columns = None
+        else:
+            self.header = []
+            self.columns = []
+        self.header_line = None
+        self.skip_count = self.options['skip_count']
+        self.absolute_row_number = -1
+        self.relative_row_number = -1
+        self.follow_position = None
+        if self.infer_types:
+            self.types = dict(self.options['types'] or {})
+        self.converters = None
+        self.interners = None
+        self.Compile()
+
+    def GetState(self):
+        """
+        Return the state of the reader which carries from one line to the next (the header, columns, row counters,
+        remaining skip_count, inferred types and the position of a followed file), as a dict which can be saved as JSON.
+        """
+        return {
+            'header': None if self.header is None else list(self.header),
+            'header_line': self.header_line,
+            'columns': None if self.columns is None else list(self.columns),
+            'absolute_row_number': self.absolute_row_number,
+            'relative_row_number': self.relative_row_number,
+            'filtered_count': self.filtered_count,
+            'skip_count': self.skip_count,
+            'types': { name: kind for name, kind in self.types.items() if isinstance(kind, str) },
+            'follow_position': self.follow_position,
+        }
+
+    def SetState(self, state):
+        """ Restore a state from GetState() """
+        self.header = state['header']
+        self.header_line = state['header_line']
+        self.columns = None if state['columns'] is None else list(state['columns'])
+        self.absolute_row_number = state['absolute_row_number']
+        self.relative_row_number = state['relative_row_number']
+        self.filtered_count = state['filtered_count']
+        self.skip_count = state['skip_count']
+        self.types.update(state['types'])
+        self.converters = None
+        self.follow_position = None if state['follow_position'] is None else dict(state['follow_position'])
+        self.Compile()
+
+    def SaveState(self, path):
+        """ Save the reader state (see GetState) to a checkpoint file, replacing it atomically """
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(self.GetState(), fh)
+        os.replace(tmp, path)
+
+    def LoadState(self, path):
+        """ Restore the reader state from a checkpoint file written by SaveState(), returning False if there is none """
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                state = json.load(fh)
+        except FileNotFoundError:
+            return False
+        self.SetState(state)
+        return True
+
+    def GetEncoding(self):
+        """ Return the encoding used for decoding file data """
+        return self.encoding or locale.getpreferredencoding(False)
+
+    def DecodeBytes(self, data):
+        """
+        Decode file data to text, converting line endings as reading a file in text mode would
+        (in binary mode, only the line endings are converted)
+        """
+        if self.binary:
+            return data.replace(b'\r\n', b'\n')
+        return data.decode(self.GetEncoding()).replace('\r\n', '\n')
+
+    def ParallelRead(self, f, workers=None, chunk_size=None):
+        """
+        Read a file using a pool of worker processes, and return a generator which yields each row in file order.
+        The file is split into byte ranges of roughly chunk_size bytes (aligned to line boundaries), and at most
+        two ranges per worker are parsed or waiting to be yielded at any time.
+        After each range, any columns generated by extra column handling are merged into GetColumns(),
+        and the row counters are advanced as if the lines had been processed by this reader.
+        Compressed files, and anything other than a regular file (such as a pipe), are read serially (see Read),
+        as are files read with extra_columns_method 'store', whose stored values depend on the lines before them,
+        and files read with options which can not be passed to a worker process (such as a lambda in where or types).
+        If a worker process fails, the error is set to "Failed reading file ..." and no further rows are yielded.
+        """
+        # pylint: disable=bare-except,too-many-branches
+        try:
+            compression = self.GetCompression(f)
+        except OSError:
+            compression = None
+        if (compression is not None or (os.path.exists(f) and not os.path.isfile(f)) or 'store' in self.extra_columns_method
+                or not _Picklable(self.options)):
+            # The byte ranges of a compressed file (or a pipe) can not be parsed independently, the stored
+            # extra values depend on the widest row before them, and the workers need the options
+            yield from self.Read(f)
+            return
+        self.error = None
+        err_generated = None
+        workers = workers or os.cpu_count() or 1
+        ranges = []
+        try:
+            with open(f, 'rb') as fh:
+                # Process the lines to be skipped, and the header, here
+                while self.header is None or (self.skip_count or 0) > 0:
+                    raw = fh.readline()
+                    if not raw:
+                        break
+                    row = self.ProcessLine(self.DecodeBytes(raw))
+                    if self.error:
+                        break
+                    if row is not None:
+                        yield row
+                if self.error:
+                    return
+                ranges = self.ByteRanges(fh, workers, chunk_size)
+        except GeneratorExit:
+            raise
+        except:
+            if self.raise_error and self.error:
+                raise
+            err_generated = "Failed reading file {}".format(f)
+
+        if ranges and not err_generated:
+            options = dict(self.options, backend=self.active_backend or self.backend, stats_callback=None)
+            header = self.header
+            first = []
+            if self.infer_types and self.converters is None:
+                # Infer the types from the first range, so that every range uses the same types
+                first = [ _ReadRange(f, ranges[0][0], ranges[0][1], options, header) ]
+                ranges = ranges[1:]
+                self.types = first[0]['types']
+                self.converters = None
+                options.update(types=self.types, infer_types=False)
+            if len(ranges) <= 1:
+                results = itertools.chain(first, [ _ReadRange(f, start, end, options, header) for start, end in ranges ])
+            else:
+                results = itertools.chain(first, self.ParallelResults(f, ranges, workers, options, header))
+            number_key = self.row_numbers if (self.dictify or self.lazy) and isinstance(self.row_numbers, str) else None
+            for result in results:
+                for col in result['columns']:
+                    if col not in self.columns:
+                        self.columns.append(col)
+                if number_key is not None:
+                    # Row numbers within the range are relative to the start of the range
+                    if self.row_number_style == 'absolute':
+                        offset = self.absolute_row_number + 1
+                    else:
+                        offset = self.relative_row_number + 1
+                    if self.lazy:
+                        for row in result['rows']:
+                            # pylint: disable=protected-access
+                            row._number += offset
+                    elif self.row_type == 'record':
+                        result['rows'] = [ row._replace(**{ number_key: row[number_key] + offset }) for row in result['rows'] ]
+                    else:
+                        for row in result['rows']:
+                            row[number_key] += offset
+                self.absolute_row_number += result['lines']
+                self.relative_row_number += result['relative']
+                self.filtered_count += result['filtered']
+                if self.stats is not None and result['stats'] is not None:
+                    before = self.stats['rows']
+                    self.MergeStats(self.stats, result['stats'])
+                    self.ReportStats(before)
+                for row in result['rows']:
+                    self.AddRow(row)
+                    yield row
+                if result['error']:
+                    err_generated = result['error']
+                    break
+
+        if err_generated:
+            self.SetError(err_generated)
+
+    @staticmethod
+    def ByteRanges(fh, workers, chunk_size=None):
+        """
+        Split the rest of a binary file handle (from its current position) into a list of (start, end) byte ranges
+        of roughly chunk_size bytes, aligned to line boundaries.
+        chunk_size defaults to a quarter of each worker's share, between 1MiB and 64MiB.
+        """
+        start = fh.tell()
+        size = os.fstat(fh.fileno()).st_size
+        if chunk_size is None:
+            chunk_size = min(max((size - start) // (workers * 4), 1024 * 1024), 64 * 1024 * 1024)
+        ranges = []
+        while start < size:
+            fh.seek(min(start + chunk_size, size))
+            fh.readline()
+            end = min(fh.tell(), size)
+            ranges.append((start, end))
+            start = end
+        return ranges
+
+    def ParallelResults(self, f, ranges, workers, options, header):
+        """ Parse byte ranges of a file in a process pool, yielding the results in order (a failed range's result has the error) """
+        # pylint: disable=bare-except
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+            def result(future):
+                try:
+                    return future.result()
+                except:
+                    return { 'rows': [], 'columns': [], 'lines': 0, 'relative': 0, 'filtered': 0, 'stats': None,
+                             'error': "Failed reading file {}: {}".format(f, sys.exc_info()[1]) }
+            for start, end in ranges:
+                if len(pending) >= workers * 2:
+                    yield result(pending.popleft())
+                try:
+                    pending.append(pool.submit(_ReadRange, f, start, end, options, header))
+                except:
+                    # The pool is broken: report it after the ranges already submitted
+                    failed = concurrent.futures.Future()
+                    failed.set_exception(sys.exc_info()[1])
+                    pending.append(failed)
+                    break
+            while pending:
+                yield result(pending.popleft())
+
+    def ReadMany(self, paths, workers=None, mode='thread'):
+        """
+        Read many files concurrently, returning a generator which yields a (path, row) tuple for each row,
+        in the order of the paths and then the rows within each file.
+        paths is a list of paths, or a glob pattern (whose matches are read in sorted order).
+        Each file is read with this reader's configuration, already resolved (dict_type, backend), by a pool of workers
+        threads (mode='thread', the default, for I/O bound reading of many small files), or processes (mode='process',
+        for parse bound reading), with at most two files per worker parsed or waiting to be yielded at any time.
+        The header of each file is checked against expected_header, and the first header seen becomes this reader's
+        header. Unless dictifying, a file whose header differs from it is reported as an error and its rows are not
+        returned, since the positions of the values would not match. Columns from every file (including columns
+        generated by extra column handling) are merged into GetColumns().
+        An error in one file does not stop the others: GetFileErrors() returns a dict of the error for each failed path,
+        and the error is set (see GetError) after all of the files have been read.
+        Header rows are not returned.
+        """
+        # pylint: disable=too-many-branches
+        self.error = None
+        self.file_errors = {}
+        if isinstance(paths, str):
+            paths = sorted(glob.glob(paths))
+        paths = list(paths)
+        options = dict(self.options, dict_type=self.dict_type, backend=self.active_backend or self.backend,
+                       return_header_row=False, keep_rows=False, raise_error=False, quiet=True, msg=None,
+                       stats_callback=None)
+        if mode == 'thread':
+            executor = concurrent.futures.ThreadPoolExecutor
+        elif mode == 'process':
+            executor = concurrent.futures.ProcessPoolExecutor
+        else:
+            raise ValueError("Unknown ReadMany mode:{}".format(mode))
+        workers = min(workers or os.cpu_count() or 1, max(len(paths), 1))
+
+        for path, result in self.ReadManyResults(paths, workers, executor, options):
+            error = result['error']
+            header = result['header']
+            # A file which failed before producing any rows may have failed on its header
+            usable = header is not None and (not error or result['rows'])
+            if usable:
+                if self.header is None:
+                    self.header = list(header)
+                    self.columns = list(header)
+                    self.Compile()
+                elif header != self.header and not self.dictify:
+                    error = "Header of {} did not match {}".format(path, self.header)
+                    usable = False
+            if error:
+                self.file_errors[path] = error
+                if not self.quiet:
+                    self.msg("ERROR:" + error)
+            if not usable:
+                continue
+            for col in result['columns']:
+                if col not in self.columns:
+                    self.columns.append(col)
+            self.absolute_row_number += result['lines']
+            self.relative_row_number += result['relative']
+            self.filtered_count += result['filtered']
+            if self.stats is not None and result['stats'] is not None:
+                before = self.stats['rows']
+                self.MergeStats(self.stats, result['stats'])
+                self.ReportStats(before)
+            for row in result['rows']:
+                self.AddRow(row)
+                yield path, row
+
+        if self.file_errors:
+            self.SetError("Failed reading {} of {} files".format(len(self.file_errors), len(paths)))
+
+    @staticmethod
+    def ReadManyResults(paths, workers, executor, options):
+        """ Read files in a pool of workers, yielding (path, result) in order """
+        # pylint: disable=bare-except
+        with executor(max_workers=workers) as pool:
+            pending = collections.deque()
+            def result(path, future):
+                try:
+                    return path, future.result()
+                except:
+                    return path, { 'header': None, 'error': "Failed reading file {}: {}".format(path, sys.exc_info()[1]) }
+            for path in paths:
+                if len(pending) >= workers * 2:
+                    yield result(*pending.popleft())
+                pending.append((path, pool.submit(_ReadFile, path, options)))
+            while pending:
+                yield result(*pending.popleft())
+
+    def GetFileErrors(self):
+        """ Return a dict of the error for each file which failed in the last ReadMany() """
+        return self.file_errors
 
     def ClearError(self):
         self.error = None
@@ -296,41 +1574,940 @@ class CsvReader:
         Handle one line from the input source - processing any outstanding skip directives
         and storing the header line separately
         """
+        line = self.FilterLine(line)
+        if line is None:
+            return None
+
+        if self.header is None:
+            return self.HandleHeader(line)
+        return self.handle_line(line)
 
+    def FilterLine(self, line):
+        """
+        Count a line and apply the skip directives, returning None if the line is to be skipped,
+        or otherwise the line with trailing whitespace removed
+        """
         self.absolute_row_number += 1
 
         if self.skip_count is not None and self.skip_count > 0:
             self.skip_count -= 1
             return None
 
-        if self.skip is not None:
-            if re.match(self.skip, line):
+        if self.skip_match is not None:
+            if self.skip_match(line):
                 return None
 
         line = line.rstrip()
         if not line:
             if self.skip_empty_lines:
                 return None
-
-        if self.header is None:
-            return self.HandleHeader(line)
-        return self.HandleData(line)
+        return line
 
     def HandleData(self, line):
+        return self.handle_data(line)
+
+    def ParseData(self, line):
+        """ Split a data line and apply extra column handling, returning the (columns, row, extras, row number) """
         self.relative_row_number += 1
-        row = list(self.SplitLine(line))
+        row = self.split_line(line)
         columns, row, extras = self.HandleExtraColumns(row)
-        if extras is not None and not self.quiet:
-            self.msg("WARNING: Unsupported extra column data method - extra data is being discarded")
-        if self.dictify:
-            row = self.Dictify(columns, row, extras)
-        self.AddRow(row)
-        return row
+        number = self.absolute_row_number if self.row_number_style == 'absolute' else self.relative_row_number
+        return columns, row, extras, number
+
+    def FinishRow(self, columns, row, extras, number=None):
+        """ Produce the final form of a parsed row (see ParseData) and store it """
+        return self.finish_row(columns, row, extras, number)
+
+    def Compile(self):
+        """
+        Build the per-row functions for the reader's current configuration, containing only the steps that
+        the configuration needs, so that options are not re-examined for every row.
+        This is done by the constructor and again whenever the header, columns or tokenizer change.
+        If any of the reader's attributes are changed directly, Compile() should be called again.
+        """
+        self.extra_columns_handler = self.CompileExtraColumns()
+        if self.stats is not None:
+            self.extra_columns_handler = self.Instrument('extra_columns', self.extra_columns_handler, self.CountExtraColumns())
+        self.where_test = self.CompileWhere()
+        self.row_parser = self.CompileRowParser()
+        self.finish_row, self.finish_needed = self.CompileFinishRow()
+        self.block_split_line = self.split_line
+        # Whether blocks of lines are split together by the csv module (see SplitLinesStdlib)
+        self.block_split_bulk = self.active_backend == 'stdlib' and self.stats is None
+        if self.stats is not None:
+            self.block_split_line = self.InstrumentSplit(self.split_line)
+            if self.where_test is not None:
+                self.where_test = self.Instrument('where', self.where_test)
+            if self.row_parser is not None:
+                self.row_parser = self.Instrument('project', self.row_parser)
+            self.finish_row = self.Instrument('finish', self.finish_row)
+        self.lazy_parse = self.CompileLazy()
+        self.handle_data = self.CompileHandleData()
+        # A subclass's HandleData is called for each data line, as it is the method-based path
+        self.handle_line = self.HandleData if type(self).HandleData is not CsvReader.HandleData else self.handle_data
+
+    def OverridesLineMethods(self):
+        """
+        Return whether a subclass overrides ProcessLine or HandleData, in which case blocks of lines are processed
+        by calling ProcessLine for each line (see ProcessBlock) rather than with the compiled functions
+        """
+        return type(self).ProcessLine is not CsvReader.ProcessLine or type(self).HandleData is not CsvReader.HandleData
+
+    def GetExtraColumnsHandler(self):
+        """
+        Return the function the compiled functions call for a row with more values than the header (see HandleExtraColumns)
+        and the length a row must exceed for it to be called.
+        A subclass's HandleExtraColumns is called for every row, as ParseData does.
+        """
+        if type(self).HandleExtraColumns is not CsvReader.HandleExtraColumns:
+            return self.HandleExtraColumns, -1
+        return self.extra_columns_handler, len(self.header)
+
+    @staticmethod
+    def NewStats():
+        return {
+            'lines': 0,
+            'bytes': 0,
+            'rows': 0,
+            'skipped': { 'skip_count': 0, 'skip': 0, 'empty': 0 },
+            'filtered': 0,
+            'quoted_lines': 0,
+            'unquoted_lines': 0,
+            'extra_columns': {},
+            'timings': {},
+        }
+
+    def GetStats(self):
+        """
+        Return the statistics gathered with stats=True (or None if it is not set), as a dict of:
+          lines, bytes: the number of lines (and characters, or bytes in binary mode, including line endings) processed
+          rows: the number of rows produced
+          skipped: the number of lines skipped by skip_count, by the skip pattern, and for being empty
+          filtered: the number of rows discarded by where
+          quoted_lines, unquoted_lines: the number of data lines split with and without quotes (the fast path)
+          extra_columns: the number of rows with extra columns, by extra column method
+          timings: for each stage, the number of calls, the number of calls timed (samples), their total seconds,
+                   and the total seconds estimated for all of the calls.
+                   The stages are 'read' (reading and decoding a block of lines), 'split', 'project' (usecols), 'where',
+                   'extra_columns', 'convert' (a block), 'finish' (dictify and storing rows) and 'consumer' (the time
+                   spent by the caller between blocks from Read).
+        """
+        if self.stats is None:
+            return None
+        ret = self.MergeStats(self.NewStats(), self.stats)
+        for timing in ret['timings'].values():
+            timing['estimated_seconds'] = timing['seconds'] / timing['samples'] * timing['calls'] if timing['samples'] else 0.0
+        return ret
+
+    @classmethod
+    def MergeStats(cls, stats, other):
+        """ Add the counters from another stats dict into stats (returning it) """
+        for key, value in other.items():
+            if isinstance(value, dict):
+                cls.MergeStats(stats.setdefault(key, {}), value)
+            else:
+                stats[key] = stats.get(key, 0) + value
+        return stats
+
+    def Instrument(self, stage, fn, count=None):
+        """ Wrap a function for stats, counting its calls (and calling count with its arguments) and timing a sample of them """
+        timing = self.stats['timings'].setdefault(stage, { 'calls': 0, 'samples': 0, 'seconds': 0.0 })
+        sample = self.stats_sample
+        perf_counter = time.perf_counter
+
+        def instrumented(*args):
+            timing['calls'] += 1
+            if count is not None:
+                count(*args)
+            if timing['calls'] % sample:
+                return fn(*args)
+            start = perf_counter()
+            ret = fn(*args)
+            timing['seconds'] += perf_counter() - start
+            timing['samples'] += 1
+            return ret
+        return instrumented
+
+    def InstrumentSplit(self, split_line):
+        """ Wrap the line splitting function for stats, counting quoted and unquoted lines """
+        stats = self.stats
+        quote = self.quotechar_test if self.binary else self.quotechar
+        def count(line):
+            if quote and quote in line:
+                stats['quoted_lines'] += 1
+            else:
+                stats['unquoted_lines'] += 1
+        return self.Instrument('split', split_line, count)
+
+    def CountExtraColumns(self):
+        events = self.stats['extra_columns']
+        method = ":".join(self.extra_columns_method) or 'none'
+        def count(_row):
+            events[method] = events.get(method, 0) + 1
+        return count
+
+    def TimedBlocks(self, blocks):
+        """ Wrap a generator of blocks of lines, timing the reading of each block """
+        perf_counter = time.perf_counter
+        blocks = iter(blocks)
+        while True:
+            start = perf_counter()
+            block = next(blocks, None)
+            if block is None:
+                return
+            self.TimeStage('read', perf_counter() - start)
+            yield block
+
+    def TimeStage(self, stage, seconds):
+        """ Record a timing for a stage which is timed every time (such as a block) """
+        timing = self.stats['timings'].setdefault(stage, { 'calls': 0, 'samples': 0, 'seconds': 0.0 })
+        timing['calls'] += 1
+        timing['samples'] += 1
+        timing['seconds'] += seconds
+
+    def CountBlock(self, lines, rows):
+        """ Update the stats after processing a block, calling stats_callback every stats_every rows """
+        stats = self.stats
+        stats['lines'] += len(lines)
+        stats['bytes'] += sum(map(len, lines)) + len(lines)
+        before = stats['rows']
+        stats['rows'] += len(rows)
+        self.ReportStats(before)
+
+    def ReportStats(self, before):
+        """ Call stats_callback if another stats_every rows have been produced since there were before rows """
+        if self.stats_callback is not None and self.stats['rows'] // self.stats_every > before // self.stats_every:
+            self.stats_callback(self.GetStats())
+
+    def CompileRowParser(self):
+        """
+        Build the function which splits a data line and applies the usecols projection (and extra column handling
+        when needed), returning (columns, row, extras). Returns None if there is no projection.
+        """
+        # pylint: disable=too-many-locals
+        header = self.header
+        if self.usecols is None or header is None:
+            return None
+        columns = self.columns
+        extra_columns, header_len = self.GetExtraColumnsHandler()
+        missing = self.missing_values
+        method = self.extra_columns_method
+
+        # Resolve each projected column to an index where possible, or leave it as a name to look up in the columns
+        resolved = []
+        for col in self.usecols:
+            if isinstance(col, int) or col not in header:
+                if not isinstance(col, int) and not self.MayHaveColumn(col):
+                    self.SetError("Unknown column {} in usecols".format(col))
+                resolved.append(col)
+            else:
+                resolved.append(header.index(col))
+
+        # Columns which are unaffected by extra column handling
+        bound = header_len - 1 if 'append-last' in method else header_len
+        if all(isinstance(col, int) and col < bound for col in resolved):
+            out_columns = [ header[idx] for idx in resolved ]
+            self.out_columns = out_columns
+            maxfields = max(resolved) + 1 if resolved else 0
+            if self.binary:
+                split_line = functools.partial(self.SplitBytes, maxfields=maxfields)
+            elif self.active_backend == 'python':
+                split_line = functools.partial(self.SplitLine, maxfields=maxfields)
+            else:
+                split_line = self.split_line
+            get = operator.itemgetter(*resolved) if len(resolved) > 1 else None
+
+            def parse_prefix(line):
+                fields = split_line(line)
+                if len(fields) < maxfields:
+                    fields = fields + [ missing ] * (maxfields - len(fields))
+                if get is not None:
+                    return out_columns, list(get(fields)), None
+                return out_columns, [ fields[idx] for idx in resolved ], None
+
+            if self.binary and not self.raw_bytes:
+                # Only the projected fields are decoded
+                encoding = self.field_encoding
+                def parse_prefix_decoded(line):
+                    fields = split_line(line)
+                    if len(fields) < maxfields:
+                        fields = [ field.decode(encoding) for field in fields ] + [ missing ] * (maxfields - len(fields))
+                        return out_columns, [ fields[idx] for idx in resolved ], None
+                    if get is not None:
+                        return out_columns, [ field.decode(encoding) for field in get(fields) ], None
+                    return out_columns, [ fields[idx].decode(encoding) for idx in resolved ], None
+                return parse_prefix_decoded
+            return parse_prefix
+
+        split_line = self.split_line
+        # The positions and names of the projected columns, recalculated whenever the columns grow
+        state = { 'count': -1, 'positions': None }
+
+        def positions():
+            count = len(columns)
+            if state['count'] != count:
+                state['count'] = count
+                state['positions'] = [ col if isinstance(col, int) else (columns.index(col) if col in columns else None) for col in resolved ]
+                self.out_columns = [ (columns[pos] if pos is not None and pos < count else str(col)) for pos, col in zip(state['positions'], resolved) ]
+            return state['positions']
+
+        positions()
+
+        def parse_full(line):
+            row = split_line(line)
+            if len(row) > header_len:
+                _columns, row, extras = extra_columns(row)
+            else:
+                extras = None
+            row_len = len(row)
+            projected = [ row[pos] if pos is not None and pos < row_len else missing for pos in positions() ]
+            return self.out_columns, projected, extras
+        return parse_full
+
+    def MayHaveColumn(self, name):
+        """
+        Return whether rows may have a column with the given name: a header column, the 'store' column,
+        or a column which would be generated for extra values (which is assumed when names are generated by a function)
+        """
+        if name in self.header or name in self.columns:
+            return True
+        method = self.extra_columns_method
+        fmt = self.extra_columns
+        if 'store' in method:
+            return name == fmt
+        if 'generate' not in method or not callable(fmt):
+            return False
+        template = getattr(fmt, '__self__', None)
+        if not isinstance(template, str):
+            return True
+        # Match the name against the format string, with a number for each replacement field
+        pattern = "".join(re.escape(literal) + (r"(\d+)" if field is not None else "") for literal, field, _spec, _conv in string.Formatter().parse(template))
+        match = re.fullmatch(pattern, name)
+        if match is None or not match.groups():
+            return False
+        number = int(match.group(1))
+        return number > len(self.header) and fmt(number) == name
+
+    def CompileLazy(self):
+        """
+        Build the function which splits the line of a LazyRow when it is first accessed, applying extra column handling,
+        usecols and type conversion, and returning (index, values) where index maps each column name to its position
+        (or to None for the row number key). Returns None if not producing lazy rows.
+        """
+        if not self.lazy or self.header is None:
+            return None
+        header = self.header
+        split_line = self.split_line
+        extra_columns, header_len = self.GetExtraColumnsHandler()
+        row_parser = self.row_parser
+        missing = self.missing_values
+        warn = None if self.quiet else self.msg
+        convert = self.ConvertRows if self.types else None
+        number_key = self.row_numbers if isinstance(self.row_numbers, str) else None
+        # The index of the columns, regenerated when the columns change
+        state = { 'columns': None, 'count': -1, 'index': None }
+
+        def parse(line):
+            if row_parser is not None:
+                columns, row, extras = row_parser(line)
+            else:
+                row = split_line(line)
+                if len(row) > header_len:
+                    columns, row, extras = extra_columns(row)
+                else:
+                    columns, extras = header, None
+            if extras is not None and warn:
+                warn("WARNING: Unsupported extra column data method - extra data is being discarded")
+            count = len(columns)
+            if len(row) < count:
+                row = row + [ missing ] * (count - len(row))
+            if convert is not None:
+                convert([ (columns, row, extras, None) ])
+            if columns is not state['columns'] or count != state['count']:
+                index = {} if number_key is None else { number_key: None }
+                index.update((name, idx) for idx, name in enumerate(columns))
+                state.update(columns=columns, count=count, index=index)
+            return state['index'], row
+        return parse
+
+    def CompileWhere(self):
+        """ Build the function which tests a data line against the where predicates, or None if there are none """
+        header = self.header
+        if not self.where or header is None:
+            return None
+        missing = self.missing_values
+        tests = []
+        for name, cond in self.where.items():
+            if self.raw_bytes and isinstance(cond, Prefix) and cond.encoding != self.field_encoding:
+                cond = Prefix(cond.prefix, self.field_encoding)
+            if callable(cond):
+                test = cond
+            elif isinstance(cond, (set, frozenset)):
+                test = cond.__contains__
+            else:
+                test = functools.partial(operator.eq, cond)
+            if name in header:
+                tests.append((header.index(name), test))
+                continue
+            # The column is missing from every row: the predicate is not called (a function may not expect
+            # missing_values, or may fail on it), and no row matches
+            self.SetError("Unknown column {} in where".format(name))
+            return lambda line: False
+        if not tests:
+            return None
+        maxfields = max(idx for idx, _test in tests) + 1
+        if self.binary:
+            split_line = functools.partial(self.SplitBytes, maxfields=maxfields)
+            if not self.raw_bytes:
+                # Only the tested fields are decoded
+                encoding = self.field_encoding
+                tests = [ (idx, (lambda value, test=test: test(value.decode(encoding) if isinstance(value, bytes) else value)))
+                          for idx, test in tests ]
+        elif self.active_backend == 'python':
+            split_line = functools.partial(self.SplitLine, maxfields=maxfields)
+        else:
+            split_line = self.split_line
+
+        if len(tests) == 1:
+            idx, test = tests[0]
+            def where_one(line):
+                fields = split_line(line)
+                return test(fields[idx] if idx < len(fields) else missing)
+            return where_one
+
+        def where_all(line):
+            fields = split_line(line)
+            count = len(fields)
+            for idx, test in tests:
+                if not test(fields[idx] if idx < count else missing):
+                    return False
+            return True
+        return where_all
+
+    def GetFilteredCount(self):
+        """ Return the number of rows discarded by the where predicates """
+        return self.filtered_count
+
+    def GetOutputColumns(self):
+        """ Return the names of the columns in each row: the projected columns if usecols is set, otherwise GetColumns() """
+        if self.usecols is not None and self.out_columns is not None:
+            return self.out_columns
+        return self.columns
+
+    def CompileHandleData(self):
+        """ Build the function which fully processes a data line (split, extra columns, conversion and finishing) """
+        header = self.header
+        if header is None:
+            return self.HandleHeader
+        split_line = self.split_line
+        extra_columns, header_len = self.GetExtraColumnsHandler()
+        row_parser = self.row_parser
+        finish = self.finish_row
+        convert = self.ConvertRows if self.UsesBlocks() and not self.lazy else None
+        absolute = self.row_number_style == 'absolute'
+        where_test = self.where_test
+        lazy_parse = self.lazy_parse
+
+        if where_test is not None:
+            self.where_test = None
+            handle_unfiltered = self.CompileHandleData()
+            self.where_test = where_test
+            def handle_filtered(line):
+                if not where_test(line):
+                    self.filtered_count += 1
+                    return None
+                return handle_unfiltered(line)
+            return handle_filtered
+
+        if lazy_parse is not None:
+            def handle_lazy(line):
+                self.relative_row_number += 1
+                number = self.absolute_row_number if absolute else self.relative_row_number
+                return finish(header, LazyRow(line, number, lazy_parse), None, number)
+            return handle_lazy
+
+        if row_parser is not None:
+            def handle_projected(line):
+                self.relative_row_number += 1
+                columns, row, extras = row_parser(line)
+                number = self.absolute_row_number if absolute else self.relative_row_number
+                if convert is not None:
+                    convert([ (columns, row, extras, number) ])
+                return finish(columns, row, extras, number)
+            return handle_projected
+
+        def handle_data(line):
+            self.relative_row_number += 1
+            row = split_line(line)
+            number = self.absolute_row_number if absolute else self.relative_row_number
+            if len(row) > header_len:
+                columns, row, extras = extra_columns(row)
+            else:
+                columns, extras = header, None
+            if convert is not None:
+                convert([ (columns, row, extras, number) ])
+            return finish(columns, row, extras, number)
+
+        return handle_data
+
+    def CompileFinishRow(self):
+        """
+        Build the function which produces the final form of a parsed row and stores it,
+        returning it and whether it does anything other than return the row as-is
+        """
+        warn = None if self.quiet else self.msg
+        dictify = self.CompileDictify()
+        add_row = None
+        if self.keep_rows or type(self).AddRow is not CsvReader.AddRow:
+            add_row = self.AddRow
+
+        if dictify is None and add_row is None:
+            def finish_row(_columns, row, extras, _number=None):
+                if extras is not None and warn:
+                    warn("WARNING: Unsupported extra column data method - extra data is being discarded")
+                return row
+            return finish_row, False
+
+        def finish_row_full(columns, row, extras, number=None):
+            if extras is not None and warn:
+                warn("WARNING: Unsupported extra column data method - extra data is being discarded")
+            if dictify is not None:
+                row = dictify(columns, row, extras, number)
+            if add_row is not None:
+                add_row(row)
+            return row
+        return finish_row_full, True
+
+    def CompileDictify(self):
+        """
+        Build the function which turns a row into a dict (or dict_type) for the dictify option, or None if not dictifying.
+        Rows shorter than the columns are padded with missing_values.
+        """
+        if not self.dictify or self.lazy:
+            return None
+        dict_type = self.dict_type
+        missing = self.missing_values
+        number_key = self.row_numbers if isinstance(self.row_numbers, str) else None
+
+        if type(self).Dictify is not CsvReader.Dictify:
+            custom = self.Dictify
+            def dictify_custom(columns, row, extras, number):
+                ret = custom(columns, row, extras)
+                if number_key is not None:
+                    ret[number_key] = number
+                return ret
+            return dictify_custom
+
+        if self.row_type == 'record':
+            return self.CompileRecord(number_key)
+
+        if dict_type is dict and number_key is None:
+            def dictify_plain(columns, row, _extras, _number):
+                if len(row) < len(columns):
+                    row = row + [ missing ] * (len(columns) - len(row))
+                return dict(zip(columns, row))
+            return dictify_plain
+
+        def dictify(columns, row, _extras, number):
+            if len(row) < len(columns):
+                row = row + [ missing ] * (len(columns) - len(row))
+            ret = dict_type()
+            if number_key is not None:
+                ret[number_key] = number
+            for _ in map(ret.__setitem__, columns, row):
+                pass
+            return ret
+        return dictify
+
+    def CompileRecord(self, number_key):
+        """ Build the dictify function for row_type='record', which regenerates the record type when the columns change """
+        missing = self.missing_values
+        state = { 'columns': None, 'count': -1, 'type': None }
+
+        def make_record(columns, row, _extras, number):
+            count = len(columns)
+            if columns is not state['columns'] or count != state['count']:
+                fields = tuple(columns) if number_key is None else (number_key,) + tuple(columns)
+                state.update(columns=columns, count=count, type=RecordType(fields))
+            if len(row) != count:
+                row = row[:count] + [ missing ] * (count - len(row))
+            if number_key is not None:
+                row = [ number ] + row
+            return state['type'](row)
+        return make_record
+
+    def UsesBlocks(self):
+        """
+        Return whether ProcessLines processes lines in blocks (see ProcessBlock), which is the case when converting types
+        (Read always does)
+        """
+        return bool(self.types or self.infer_types or self.intern_columns)
+
+    def Blocks(self, lines):
+        """ Split an iterable of lines into lists of up to block_size lines """
+        lines = iter(lines)
+        block_size = self.block_size
+        while True:
+            block = list(itertools.islice(lines, block_size))
+            if not block:
+                return
+            yield block
+
+    def ProcessBlock(self, lines):
+        """
+        Handle a block of lines, returning a list of the rows produced.
+        This is equivalent to calling ProcessLine for each line, but the skip checks and splitting are done in a
+        single loop with the reader's settings held in local variables, typed columns are converted for the whole
+        block at once, and then the rows are finished (see FinishRow).
+        With the stdlib backend, the lines are split together after the loop (see SplitLinesStdlib).
+        Processing stops at the end of the block, or when an error is set.
+        If a subclass overrides ProcessLine or HandleData, ProcessLine is called for each line instead.
+        """
+        # pylint: disable=bare-except,too-many-locals,too-many-branches
+        if self.OverridesLineMethods():
+            return self.ProcessBlockLines(lines)
+        rows = []
+        parsed = []
+        raw = ""
+        absolute = self.absolute_row_number
+        relative = self.relative_row_number
+        skip_count = self.skip_count or 0
+        skip_match = self.skip_match
+        skip_empty_lines = self.skip_empty_lines
+        header = self.header
+        extra_columns, header_len = self.GetExtraColumnsHandler() if header is not None else (None, 0)
+        split_line = self.block_split_line
+        row_parser = self.row_parser
+        where_test = self.where_test
+        lazy_parse = self.lazy_parse
+        stats = self.stats
+        filtered = 0
+        absolute_numbers = self.row_number_style == 'absolute'
+        append = parsed.append
+        # The lines (and their row numbers) to be split together with the stdlib backend
+        bulk = self.block_split_bulk
+        pending = []
+        numbers = []
+        try:
+            for raw in lines:
+                absolute += 1
+                if skip_count > 0:
+                    skip_count -= 1
+                    continue
+                if skip_match is not None and skip_match(raw):
+                    if stats is not None:
+                        stats['skipped']['skip'] += 1
+                    continue
+                line = raw.rstrip()
+                if not line and skip_empty_lines:
+                    if stats is not None:
+                        stats['skipped']['empty'] += 1
+                    continue
+                if header is None:
+                    self.absolute_row_number = absolute
+                    self.relative_row_number = relative
+                    row = self.HandleHeader(line)
+                    relative = self.relative_row_number
+                    if self.error:
+                        break
+                    if row is not None:
+                        rows.append(row)
+                    header = self.header
+                    extra_columns, header_len = self.GetExtraColumnsHandler()
+                    split_line = self.block_split_line
+                    bulk = self.block_split_bulk
+                    row_parser = self.row_parser
+                    where_test = self.where_test
+                    lazy_parse = self.lazy_parse
+                    continue
+                if where_test is not None and not where_test(line):
+                    filtered += 1
+                    continue
+                relative += 1
+                if lazy_parse is not None:
+                    number = absolute if absolute_numbers else relative
+                    append((header, LazyRow(line, number, lazy_parse), None, number))
+                    continue
+                if row_parser is not None:
+                    columns, row, extras = row_parser(line)
+                    append((columns, row, extras, absolute if absolute_numbers else relative))
+                    continue
+                if bulk:
+                    pending.append(line)
+                    numbers.append(absolute if absolute_numbers else relative)
+                    continue
+                row = split_line(line)
+                if len(row) > header_len:
+                    columns, row, extras = extra_columns(row)
+                    append((columns, row, extras, absolute if absolute_numbers else relative))
+                else:
+                    append((header, row, None, absolute if absolute_numbers else relative))
+            if pending:
+                for row, number in zip(self.SplitLinesStdlib(pending), numbers):
+                    if len(row) > header_len:
+                        columns, row, extras = extra_columns(row)
+                        append((columns, row, extras, number))
+                    else:
+                        append((header, row, None, number))
+        except:
+            self.failed_line = raw
+            raise
+        finally:
+            self.absolute_row_number = absolute
+            self.relative_row_number = relative
+            self.filtered_count += filtered
+            if stats is not None:
+                stats['filtered'] += filtered
+                stats['skipped']['skip_count'] += (self.skip_count or 0) - skip_count
+            if self.skip_count is not None:
+                self.skip_count = skip_count
+        try:
+            if parsed and self.UsesBlocks() and not self.lazy:
+                if stats is not None:
+                    start = time.perf_counter()
+                    count = self.ConvertRows(parsed)
+                    self.TimeStage('convert', time.perf_counter() - start)
+                else:
+                    count = self.ConvertRows(parsed)
+                # With type_errors='error', the rows before the first one which failed to convert are still produced
+                del parsed[count:]
+            if parsed:
+                if self.finish_needed or any(item[2] is not None for item in parsed):
+                    rows.extend(itertools.starmap(self.finish_row, parsed))
+                else:
+                    rows.extend([ item[1] for item in parsed ])
+        except:
+            # The rows of a block are converted and finished together, so the failing line is not known: report the last one
+            self.failed_line = raw
+            raise
+        if stats is not None:
+            self.CountBlock(lines, rows)
+        return rows
+
+    def ProcessBlockLines(self, lines):
+        """ Handle a block of lines by calling ProcessLine for each one, returning a list of the rows produced (see ProcessBlock) """
+        # pylint: disable=bare-except
+        rows = []
+        raw = ""
+        try:
+            for raw in lines:
+                row = self.ProcessLine(raw)
+                if self.error:
+                    break
+                if row is not None:
+                    rows.append(row)
+        except:
+            self.failed_line = raw
+            raise
+        return rows
+
+    def ProcessLinesBatched(self, lines, batch_size=None):
+        """
+        Process a number of lines, returning a generator which yields lists of batch_size rows (the last may be shorter).
+        batch_size defaults to block_size.
+        """
+        return self.Batches(self.ProcessBlocks(lines), batch_size or self.block_size)
+
+    def ProcessBlocks(self, lines):
+        """ Process a number of lines in blocks, returning a generator which yields the list of rows for each block """
+        for block in self.Blocks(lines):
+            rows = self.ProcessBlock(block)
+            if rows:
+                yield rows
+            if self.error:
+                break
+
+    def GetTypes(self):
+        """ Return the types of the columns (as given in the constructor, plus any that have been inferred) """
+        return self.types
+
+    def GetConversionErrors(self):
+        """ Return the number of values which could not be converted """
+        return self.conversion_errors
+
+    def InferTypes(self, rows):
+        """ Infer the types of any columns not already given in types, from a sample of (list) rows """
+        sample = rows[:self.infer_sample]
+        for idx, name in enumerate(self.GetOutputColumns()):
+            if name in self.types:
+                continue
+            values = [ row[idx] for row in sample if idx < len(row) and isinstance(row[idx], (str, bytes)) and row[idx] ]
+            if self.raw_bytes:
+                values = [ value.decode(self.field_encoding) if isinstance(value, bytes) else value for value in values ]
+            self.types[name] = 'str'
+            if not values:
+                continue
+            for spec in INFERRED_TYPES:
+                try:
+                    # pylint: disable=bare-except
+                    for _ in map(TYPE_CONVERTERS[spec], values):
+                        pass
+                except:
+                    continue
+                self.types[name] = spec
+                break
+
+    def ResolveTypes(self, rows):
+        """ Determine the (column index, converter) pairs used for type conversion """
+        if self.infer_types:
+            self.InferTypes(rows)
+        self.converters = []
+        columns = self.GetOutputColumns()
+        for name, spec in self.types.items():
+            if name not in columns:
+                continue
+            convert = spec if callable(spec) else TYPE_CONVERTERS[spec]
+            if self.raw_bytes and not callable(spec) and spec not in ('int', 'float'):
+                # int() and float() accept bytes, other values are decoded first (so 'str' columns are just decoded)
+                convert = self.DecodingConverter(convert)
+            if convert is not None:
+                self.converters.append((columns.index(name), convert))
+        self.ResolveInterning(rows)
+
+    def ResolveInterning(self, rows):
+        """
+        Determine the (column index, InternTable) pairs used for interning, choosing the columns from the rows
+        if intern_columns is 'auto'
+        """
+        self.interners = []
+        if not self.intern_columns:
+            return
+        columns = self.GetOutputColumns()
+        converted = { idx for idx, _convert in self.converters }
+        names = self.intern_columns
+        if names == 'auto':
+            names = []
+            limit = len(rows) // AUTO_INTERN_RATIO
+            for idx, name in enumerate(columns):
+                if idx in converted:
+                    continue
+                distinct = set()
+                for row in rows:
+                    if idx < len(row) and isinstance(row[idx], (str, bytes)):
+                        distinct.add(row[idx])
+                        if len(distinct) > limit:
+                            break
+                if distinct and len(distinct) <= limit:
+                    names.append(name)
+        for name in names:
+            if name not in columns or columns.index(name) in converted:
+                # Only string columns are interned
+                continue
+            table = self.intern_tables.setdefault(name, InternTable())
+            self.interners.append((columns.index(name), table))
+
+    def GetInternColumns(self):
+        """ Return the names of the interned columns (which are only known once the first block has been read, with 'auto') """
+        return list(self.intern_tables)
+
+    def GetInternTable(self, name):
+        """ Return the InternTable of an interned column (a dict whose keys are its distinct values), or None """
+        return self.intern_tables.get(name)
+
+    def DecodingConverter(self, convert):
+        """ Return a converter which decodes a bytes value before converting it with convert (if not None) """
+        encoding = self.field_encoding
+        if convert is None:
+            return operator.methodcaller('decode', encoding)
+        return lambda value: convert(value.decode(encoding))
+
+    def ConvertRows(self, parsed):
+        """
+        Convert the typed columns of a list of parsed (columns, row, extras) rows, in place.
+        Each column is converted with a single map() over the values of the whole block,
+        falling back to converting values one at a time only for empty values or values that fail to convert.
+        Then the values of interned columns are replaced by their shared copies.
+        Returns the number of rows converted: if type_errors is 'error', the rows from the first one with a value
+        which fails to convert are left unconverted, and the error is set for that value.
+        """
+        rows = [ item[1] for item in parsed ]
+        if self.converters is None:
+            self.ResolveTypes(rows)
+        empty = self.newline[:0]
+        shortest = min(map(len, rows))
+        failure = None
+        for idx, convert in self.converters:
+            failed = None
+            values = [ row[idx] for row in rows ] if shortest > idx else None
+            if values is None:
+                failed = self.ConvertValues([ row for row in rows if len(row) > idx ], idx, convert)
+            elif empty in values:
+                failed = self.ConvertValues(rows, idx, convert)
+            else:
+                try:
+                    # pylint: disable=bare-except
+                    converted = list(map(convert, values))
+                except:
+                    failed = self.ConvertValues(rows, idx, convert)
+                else:
+                    for _ in map(operator.setitem, rows, itertools.repeat(idx), converted):
+                        pass
+            if failed is not None:
+                # Only the rows before the failing one are kept, so the other columns need only be converted for those
+                failure = failed[idx], idx
+                rows = rows[:next(pos for pos, row in enumerate(rows) if row is failed)]
+                if not rows:
+                    break
+        for idx, table in self.interners:
+            if shortest <= idx:
+                self.InternValues([ row for row in rows if len(row) > idx ], idx, table)
+                continue
+            try:
+                interned = list(map(table.__getitem__, [ row[idx] for row in rows ]))
+            except TypeError:
+                self.InternValues(rows, idx, table)
+                continue
+            for _ in map(operator.setitem, rows, itertools.repeat(idx), interned):
+                pass
+        if failure is not None:
+            self.SetError("Failed converting value {} in column {}".format(repr(failure[0]), self.GetOutputColumns()[failure[1]]))
+        return len(rows)
+
+    @staticmethod
+    def InternValues(rows, idx, table):
+        """ Intern one column of a list of rows a value at a time, leaving any values which are not strings """
+        for row in rows:
+            value = row[idx]
+            if isinstance(value, (str, bytes)):
+                row[idx] = table[value]
+
+    def ConvertValues(self, rows, idx, convert):
+        """
+        Convert one column of a list of rows a value at a time, applying the type_errors policy to any failures.
+        If type_errors is 'error', stops at the first failure and returns its row (the error is set by ConvertRows),
+        and otherwise returns None.
+        """
+        missing = self.missing_values
+        empty = self.newline[:0]
+        for row in rows:
+            value = row[idx]
+            if value == empty:
+                row[idx] = missing
+                continue
+            try:
+                # pylint: disable=bare-except
+                row[idx] = convert(value)
+            except:
+                self.conversion_errors += 1
+                if self.type_errors == 'error':
+                    return row
+                errmsg = "Failed converting value {} in column {}".format(repr(value), self.GetOutputColumns()[idx])
+                if not self.quiet:
+                    self.msg("WARNING:" + errmsg)
+                if self.type_errors == 'missing':
+                    row[idx] = missing
+        return None
 
     def HandleHeader(self, line):
-        self.header_line = line
-        self.header = list(self.SplitLine(line))
+        if isinstance(line, bytes):
+            line = line.decode(self.GetEncoding())
+            self.header_line = line
+            self.header = self.SplitLine(line)
+        else:
+            self.header_line = line
+            self.header = self.split_line(line)
         self.columns = [] + self.header
+        self.Compile()
         expected = self.expected_header
         if expected is not None:
             if isinstance(expected, list):
@@ -346,6 +2523,8 @@ class CsvReader:
                 return None
         if self.return_header_row:
             self.relative_row_number += 1
+            if self.usecols is not None:
+                return list(self.GetOutputColumns())
             return self.header
         return None
 
@@ -357,15 +2536,22 @@ class CsvReader:
             raise ValueError(self.error)
 
     def HandleExtraColumns(self, row):
+        """
+        Apply the extra columns method to a row, returning (columns, row, extras)
+        where extras is any extra data which was not handled
+        """
         header = self.header
-        columns = self.columns
-        orig_col_count = len(header)
-        current_col_count = len(columns)
-        row_len = len(row)
-
-        if row_len <= orig_col_count:
+        if len(row) <= len(header):
             # Nothing to do
             return header, row, None
+        return self.extra_columns_handler(row)
+
+    def CompileExtraColumns(self):
+        """
+        Build the function which handles a row that has more values than the header (see HandleExtraColumns),
+        specialised for the extra columns method.
+        """
+        # pylint: disable=too-many-locals
 
         #Example use cases:
         #   Example input data:
@@ -384,67 +2570,77 @@ class CsvReader:
 
         method = self.extra_columns_method
         fmt = self.extra_columns
+        columns = self.columns
+        sep = self.sep_bytes if self.raw_bytes else self.sep
+        as_list = 'as-list' in method
 
         if 'generate' in method:
-            columns = self.columns
-            if row_len > current_col_count:
+            snapshots = {}
+            def generate(row):
                 # Simply add new individual header columns with an appropriate generated name
-                for idx in range(current_col_count + 1, row_len + 1):
-                    columns.append(fmt(idx))
-            # Now return the row as-is, with no extras (columns have been generated for the extras)
-            return columns, row, None
+                row_len = len(row)
+                current_col_count = len(columns)
+                if row_len > current_col_count:
+                    columns.extend([ fmt(idx) for idx in range(current_col_count + 1, row_len + 1) ])
+                # Return the row as-is, with no extras (columns have been generated for the extras).
+                # Rows are finished after a whole block has been parsed, by which time later rows may have generated
+                # more columns, so each row gets a (shared) copy of the columns up to its length
+                snapshot = snapshots.get(row_len)
+                if snapshot is None:
+                    snapshot = snapshots[row_len] = columns[:row_len]
+                return snapshot, row, None
+            return generate
 
         if 'append-last' in method:
             # The last value is replaced with either a merged string, or a list,
             # no extra columns are added (the extra data is in the last column)
-            last_col = current_col_count - 1
-            if 'as-list' in method:
-                # Replace the last column with a list containing that column and any extra values
-                extras = row[last_col:]
-                del row[last_col:]
-                row.append(extras)
-            else:
-                # Replace the last column with a string containing the merged extra values
+            def append_last(row):
+                last_col = len(columns) - 1
                 extras = row[last_col:]
                 del row[last_col:]
-                row.append(self.sep.join(extras))
-            return columns, row, None
+                row.append(extras if as_list else sep.join(extras))
+                return columns, row, None
+            return append_last
 
-        last_col = current_col_count
-        extras = row[last_col:]
-        del row[last_col:]
+        store = 'store' in method
+        ignore = 'ignore' in method
+        missing = self.missing_values
 
-        if 'store' in method:
-            if 'as-list' not in method:
-                # Replace the last column with a list containing that column and any extra values
-                extras = self.sep.join(extras)
-
-            idx = None
-            # An extra named value is created, but not permanently added to the header
-            if fmt not in columns:
-                columns.append(fmt)
-                row.append(extras)
-                extras = None
-            else:
-                idx = columns.index(fmt)
-                if idx < row_len:
-                    # Adding to an exising column
-                    existing = row[idx]
-                    if 'as-list' in method:
-                        extras = [existing] + extras
-                    else:
-                        extras = existing + self.sep + extras
+        def other(row):
+            row_len = len(row)
+            last_col = len(columns)
+            extras = row[last_col:]
+            del row[last_col:]
+
+            if store:
+                if not as_list:
+                    extras = sep.join(extras)
+
+                # An extra named value is created, but not permanently added to the header
+                if fmt not in columns:
+                    columns.append(fmt)
+                    row.append(extras)
                 else:
-                    while len(row) < idx - 1:
-                        row.append(self.missing_values)
-                row[idx] = extras
+                    idx = columns.index(fmt)
+                    if idx < row_len:
+                        # Adding to an exising column
+                        existing = row[idx]
+                        if as_list:
+                            extras = [existing] + extras
+                        else:
+                            extras = existing + sep + extras
+                    else:
+                        while len(row) < idx - 1:
+                            row.append(missing)
+                    row[idx] = extras
                 extras = None
 
-        if 'ignore' in method:
-            # silently discard the data as requested
-            extras = None
+            if ignore:
+                # silently discard the data as requested
+                extras = None
 
-        return columns, row, extras
+            return columns, row, extras
+        return other
 
     def Dictify(self, columns, row, extras):
         """
@@ -465,14 +2661,20 @@ class CsvReader:
         """
         Process a chunk of text data as if it was a file (split into lines and then process)
         """
-        lines = data.replace('\r\n','\n').split('\n')
-        for line in self.ProcessLines(lines):
-            yield line
+        if isinstance(data, bytes):
+            lines = data.replace(b'\r\n', b'\n').split(b'\n')
+        else:
+            lines = data.replace('\r\n','\n').split('\n')
+        yield from self.ProcessLines(lines)
 
     def ProcessLines(self, lines):
         """
         Process a number of lines
         """
+        if self.UsesBlocks() or self.stats is not None:
+            for rows in self.ProcessBlocks(lines):
+                yield from rows
+            return
         for line in lines:
             ret = self.ProcessLine(line)
             if ret is not None:
@@ -0,0 +1,178 @@
+"""
+provides ReadIndexed, for loading a reference csv file into a LookupTable keyed on one or more columns in a single pass
+"""
+# pylint: disable=missing-function-docstring
+import os
+import pickle
+import operator
+
+from readcsv.csvreader import CsvReader, RecordType
+
+LOOKUP_VERSION = 1
+
+DUPLICATE_POLICIES = [ 'error', 'first', 'last' ]
+
+class LookupTable:
+    """
+    The result of ReadIndexed: a mapping from each key to the values of its row (or rows).
+    A key is the value of the key column, or a tuple of the values of the key columns for a composite key.
+    The values are stored as a Record (see csvreader.Record) of the value columns, which is a tuple.
+    get(key) returns the first row for a key (or default), get_all(key) returns a list of all of them (empty if none),
+    and table[key], key in table, len(table) (the number of keys) and keys() are as for a dict.
+    """
+    def __init__(self, key, columns, unique, entries=None, error=None):
+        self.key = key
+        self.columns = columns
+        self.unique = unique
+        self.entries = entries if entries is not None else {}
+        self.error = error
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        entry = self.entries[key]
+        return entry[0] if isinstance(entry, list) else entry
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        return entry[0] if isinstance(entry, list) else entry
+
+    def get_all(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return []
+        return list(entry) if isinstance(entry, list) else [ entry ]
+
+    def keys(self):
+        return self.entries.keys()
+
+    def GetColumns(self):
+        """ Return the names of the value columns """
+        return self.columns
+
+    def GetError(self):
+        return self.error
+
+    def Save(self, path, source=None):
+        """ Save the table (with the state of the source file, if given, for Load) to path, returning False if it could not be written """
+        # pylint: disable=bare-except
+        tmp = path + '.tmp'
+        data = {
+            'version': LOOKUP_VERSION,
+            'source': source,
+            'key': self.key,
+            'columns': self.columns,
+            'unique': self.unique,
+            'entries': self.entries,
+        }
+        try:
+            with open(tmp, 'wb') as fh:
+                pickle.dump(data, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except:
+            return False
+        return True
+
+    @classmethod
+    def Load(cls, path, source=None):
+        """ Load a saved table, returning None if there is none, or it was saved with a different source state """
+        # pylint: disable=bare-except
+        try:
+            with open(path, 'rb') as fh:
+                data = pickle.load(fh)
+        except:
+            return None
+        if not isinstance(data, dict) or data.get('version') != LOOKUP_VERSION:
+            return None
+        if source is not None and data.get('source') != source:
+            return None
+        return cls(data['key'], data['columns'], data['unique'], data['entries'])
+
+def _SourceState(path, params):
+    st = os.stat(path)
+    return { 'path': os.path.realpath(path), 'size': st.st_size, 'mtime': st.st_mtime_ns, 'params': repr(params) }
+
+def ReadIndexed(path, key, values=None, unique=True, duplicates='error', index_path=None, **options):
+    """
+    Read a csv file into a LookupTable keyed on the key column (or list of columns, for a composite key),
+    building the index while parsing rather than keeping the rows and indexing them afterwards.
+    values is the list of columns to store for each row, defaulting to every column of the header other than the keys;
+    only the key and value columns are split out of each line (see usecols) and converted (see types).
+    If unique is True, duplicates is the policy for a key which appears more than once:
+    'error' (the default) sets the error (see GetError) and stops reading, 'first' keeps the first row and 'last' the last.
+    If unique is False, every row of a key is kept (see get_all).
+    If index_path is given, the table is saved there, and later calls load it rather than reading the file
+    as long as the file size and modification time, and the arguments, are unchanged.
+    The other reader options are as for CsvReader (dictify, row_type, lazy and return_header_row are not used).
+    """
+    # pylint: disable=too-many-locals,too-many-branches
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError("Unknown duplicates policy:{}".format(duplicates))
+    keys = list(key) if isinstance(key, (list, tuple)) else [ key ]
+    source = None
+    if index_path is not None:
+        source = _SourceState(path, (keys, values, unique, duplicates, sorted(options.items())))
+        table = LookupTable.Load(index_path, source)
+        if table is not None:
+            return table
+
+    options.update(dictify=False, row_type=None, lazy=False, return_header_row=False, keep_rows=False)
+    if values is not None:
+        values = list(values)
+        options['usecols'] = keys + [ col for col in values if col not in keys ]
+    reader = CsvReader(**options)
+    table = LookupTable(key, values, unique)
+    entries = table.entries
+    get_key = get_values = make = None
+    for rows in reader.ReadBlocks(path):
+        if get_key is None:
+            columns = reader.GetOutputColumns()
+            missing = [ col for col in keys + (values or []) if col not in reader.GetColumns() ]
+            if missing:
+                reader.SetError("Unknown column {} for ReadIndexed".format(missing[0]))
+                break
+            if values is None:
+                values = [ col for col in columns if col not in keys ]
+                table.columns = values
+            get_key = operator.itemgetter(*[ columns.index(col) for col in keys ])
+            positions = [ columns.index(col) for col in values ]
+            get_values = operator.itemgetter(*positions) if len(positions) > 1 else None
+            make = RecordType(tuple(values))
+            width = max(positions + [ columns.index(col) for col in keys ]) + 1
+            missing_value = reader.missing_values
+        if any(len(row) < width for row in rows):
+            rows = [ row + [ missing_value ] * (width - len(row)) if len(row) < width else row for row in rows ]
+        block_keys = list(map(get_key, rows))
+        if get_values is not None:
+            block_values = list(map(make, map(get_values, rows)))
+        else:
+            block_values = [ make([ row[idx] for idx in positions ]) for row in rows ]
+        if (unique and duplicates == 'last') or (len(set(block_keys)) == len(block_keys) and entries.keys().isdisjoint(block_keys)):
+            # No duplicates to handle
+            entries.update(zip(block_keys, block_values))
+            continue
+        for row_key, row_values in zip(block_keys, block_values):
+            entry = entries.get(row_key)
+            if entry is None:
+                entries[row_key] = row_values
+            elif not unique:
+                if isinstance(entry, list):
+                    entry.append(row_values)
+                else:
+                    entries[row_key] = [ entry, row_values ]
+            elif duplicates == 'error':
+                reader.SetError("Duplicate key {} in {}".format(repr(row_key), path))
+                break
+        if reader.error:
+            break
+
+    table.error = reader.error
+    if index_path is not None and not table.error:
+        table.Save(index_path, source)
+    return table
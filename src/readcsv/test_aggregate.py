@@ -0,0 +1,84 @@
+"""
+tests for aggregate
+"""
+import os
+import gzip
+import pickle
+import tempfile
+import unittest
+
+# pylint: disable=wildcard-import,missing-function-docstring,unused-wildcard-import
+
+from readcsv.aggregate import *
+
+
+def exit_worker(_value):
+    """ A converter which ends the (worker) process """
+    os._exit(1)  # pylint: disable=protected-access
+
+class TestAggregate(unittest.TestCase):
+    """ Test Aggregate """
+
+    def write_file(self, lines, suffix=".csv"):
+        fd, path = tempfile.mkstemp(suffix)
+        self.addCleanup(os.unlink, path)
+        with open(fd, "w") as f:
+            for line in lines:
+                print(line, file=f)
+        return path
+
+    aggs = {
+        "rows": (None, "count"),
+        "sizes": ("size", "count"),
+        "total": ("size", "sum"),
+        "smallest": ("size", "min"),
+        "largest": ("size", "max"),
+        "average": ("size", "mean"),
+    }
+
+    def test_aggregate(self):
+        path = self.write_file([ "host,status,size,note", "a,ok,10,x", "b,ok,5", "a,err,,y", "a,ok,2.5,z,extra" ])
+        result = Aggregate(path, "host", self.aggs, block_size=2)
+        self.assertIsNone(result.GetError())
+        self.assertEqual(result.GetResults(), {
+            "a": { "rows": 3, "sizes": 2, "total": 12.5, "smallest": 2.5, "largest": 10.0, "average": 6.25 },
+            "b": { "rows": 1, "sizes": 1, "total": 5.0, "smallest": 5.0, "largest": 5.0, "average": 5.0 },
+        })
+
+        result = Aggregate(path, [ "host", "status" ], { "n": (None, "count"), "last": ("note", "max") }, types={ "note": "str" }, where={ "host": "a" })
+        self.assertEqual(result.GetResults(), { ("a", "ok"): { "n": 2, "last": "z" }, ("a", "err"): { "n": 1, "last": "y" } })
+        self.assertEqual(Aggregate(path, [], { "n": (None, "count") }).get(()), { "n": 4 })
+        self.assertEqual(Aggregate(path, "nope", self.aggs, quiet=True).GetError(), "Unknown column nope in usecols")
+        with self.assertRaises(ValueError):
+            Aggregate(path, "host", { "x": (None, "sum") })
+
+    def test_merge(self):
+        lines = [ "k,v" ] + [ "{},{}".format("abc"[i % 3], i) for i in range(300) ]
+        path = self.write_file(lines)
+        aggs = { "total": ("v", "sum"), "n": (None, "count"), "top": ("v", "max") }
+        expected = Aggregate(path, "k", aggs)
+        first = self.write_file(lines[:150])
+        second = self.write_file([ lines[0] ] + lines[150:])
+        merged = Aggregate([ first, second ], "k", aggs)
+        self.assertEqual(merged.GetResults(), expected.GetResults())
+        self.assertEqual(pickle.loads(pickle.dumps(merged)).GetResults(), expected.GetResults())
+
+        parallel = Aggregate(path, "k", aggs, workers=2, chunk_size=200)
+        self.assertIsNone(parallel.GetError())
+        self.assertEqual(parallel.GetResults(), expected.GetResults())
+
+        self.assertEqual(Aggregate(path, "k", aggs, workers=2, chunk_size=200, where={ "k": lambda k: k != "c" }).GetResults(),
+                         { key: value for key, value in expected.GetResults().items() if key != "c" })
+        failed = Aggregate(path, "k", aggs, workers=2, chunk_size=200, quiet=True, types={ "v": exit_worker })
+        self.assertTrue(failed.GetError().startswith("Failed reading file {}: ".format(path)))
+
+        compressed = path + ".gz"
+        self.addCleanup(os.unlink, compressed)
+        with open(path, "rb") as src, gzip.open(compressed, "wb") as dst:
+            dst.write(src.read())
+        serial = Aggregate(compressed, "k", aggs, workers=2)
+        self.assertEqual(serial.GetResults(), expected.GetResults())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+tests for cache
+"""
+import os
+import tempfile
+import unittest
+
+# pylint: disable=wildcard-import,missing-function-docstring,unused-wildcard-import
+
+from readcsv.cache import *
+
+
+class TestCachedCsvReader(unittest.TestCase):
+    """ Test CachedCsvReader """
+
+    def write_file(self, lines):
+        fd, path = tempfile.mkstemp(".csv")
+        self.addCleanup(os.unlink, path)
+        with open(fd, "w") as f:
+            for line in lines:
+                print(line, file=f)
+        return path
+
+    def test_cached_read(self):
+        path = self.write_file([ "a,b", "1,2", "3,4,5" ])
+        cache = ParseCache()
+        options = dict(dictify=True, dict_type=dict, return_header_row=False, block_size=1)
+        expected = list(CsvReader(**options).Read(path))
+
+        r = CachedCsvReader(cache=cache, **options)
+        self.assertEqual(list(r.Read(path)), expected)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 1, 1))
+
+        r = CachedCsvReader(cache=cache, **options)
+        self.assertEqual(list(r.ReadBatches(path, batch_size=5)), [ expected ])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(r.GetColumns(), [ "a", "b", "column_3" ])
+        self.assertEqual((r.GetHeader(), r.absolute_row_number, r.relative_row_number), ([ "a", "b" ], 2, 1))
+
+        # Different options, or a changed file, are parsed again
+        self.assertEqual(list(CachedCsvReader(cache=cache, **dict(options, dictify=False)).Read(path)), [ [ "1", "2" ], [ "3", "4", "5" ] ])
+        with open(path, "a") as f:
+            print("6,7", file=f)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        self.assertEqual(len(list(CachedCsvReader(cache=cache, **options).Read(path))), 3)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_callable_options(self):
+        path = self.write_file([ "a,b", "1,2", "3,4" ])
+        cache = ParseCache()
+        # Named functions and classes are keyed by their names
+        self.assertEqual(list(CachedCsvReader(cache=cache, where={ "a": str.isdigit }, types={ "b": int }).Read(path)),
+                         [ [ "a", "b" ], [ "1", 2 ], [ "3", 4 ] ])
+        self.assertEqual(len(list(CachedCsvReader(cache=cache, where={ "a": str.isdigit }, types={ "b": int }).Read(path))), 3)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 1, 1))
+        self.assertIn("builtins.int", cache.KeyValue({ "b": int }))
+
+        # Lambdas are not cached, as another lambda could later have the same address
+        for _ in range(2):
+            rows = list(CachedCsvReader(cache=cache, where={ "a": lambda value: value == "1" }).Read(path))
+            self.assertEqual(rows, [ [ "a", "b" ], [ "1", "2" ] ])
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 1, 1))
+        with self.assertRaises(ValueError):
+            cache.KeyValue([ lambda value: value ])
+
+    def test_limits_and_disk(self):
+        paths = [ self.write_file([ "a", str(i) * 100 ]) for i in range(3) ]
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ParseCache(max_bytes=600, directory=directory)
+            for path in paths:
+                list(CachedCsvReader(cache=cache).Read(path))
+            # Only the most recent entries fit in memory, but all of them are on disk
+            self.assertLess(len(cache), 3)
+            self.assertLessEqual(cache.total_bytes, 600)
+            self.assertEqual(len(os.listdir(directory)), 3)
+
+            fresh = ParseCache(directory=directory)
+            self.assertEqual(list(CachedCsvReader(cache=fresh).Read(paths[0])), [ [ "a" ], [ "0" * 100 ] ])
+            self.assertEqual((fresh.hits, fresh.misses), (1, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+tests for columnar
+"""
+import os
+import datetime
+import tempfile
+import unittest
+
+# pylint: disable=wildcard-import,missing-function-docstring,unused-wildcard-import
+
+from readcsv.columnar import *
+
+
+class TestReadColumns(unittest.TestCase):
+    """ Test ReadColumns """
+
+    def write_file(self, lines):
+        fd, path = tempfile.mkstemp(".csv")
+        self.addCleanup(os.unlink, path)
+        with open(fd, "w") as f:
+            for line in lines:
+                print(line, file=f)
+        return path
+
+    def test_read_columns(self):
+        path = self.write_file([ "a,b,c", "1,x,2.5", "2,,", "3,z,4,extra", "4,w,5" ])
+        table = ReadColumns(path, types={ "a": int, "c": float }, block_size=2, dict_type=dict)
+        self.assertIsNone(table.reader.GetError())
+        self.assertEqual(table.GetColumns(), [ "a", "b", "c", "column_4" ])
+        self.assertEqual(len(table), 4)
+        self.assertEqual(list(table["a"]), [ 1, 2, 3, 4 ])
+        self.assertEqual(list(table["b"]), [ "x", "", "z", "w" ])
+        self.assertEqual(list(table["c"]), [ 2.5, None, 4.0, 5.0 ])
+        self.assertEqual(list(table["column_4"]), [ None, None, "extra", None ])
+        self.assertEqual(table["b"][2], "z")
+
+    def test_reader_types(self):
+        path = self.write_file([ "a,b", "1,x", "2,y" ])
+        table = ReadColumns(path, infer_types=True, use_numpy=False)
+        self.assertIsInstance(table["a"], ArrayColumn)
+        self.assertEqual(list(table["a"]), [ 1, 2 ])
+        self.assertEqual(list(table["b"]), [ "x", "y" ])
+
+    def test_passed_types(self):
+        path = self.write_file([ "a,b,c", "1,2024-01-02,x", "2,,y" ])
+        table = ReadColumns(path, types={ "a": "int", "b": "date", "c": "category" }, use_numpy=False)
+        self.assertIsNone(table.reader.GetError())
+        self.assertEqual(table.reader.GetTypes(), { "a": "int", "b": "date" })
+        self.assertIsInstance(table["a"], ArrayColumn)
+        self.assertEqual(list(table["a"]), [ 1, 2 ])
+        self.assertEqual(list(table["b"]), [ datetime.date(2024, 1, 2), None ])
+        self.assertIsInstance(table["c"], CategoricalColumn)
+
+    def test_missing_values_and_lists(self):
+        path = self.write_file([ "a,b", "1", "2,3,4" ])
+        table = ReadColumns(path, extra_columns_method="append-last:as-list", missing_values="-", use_numpy=False)
+        self.assertEqual(list(table["a"]), [ "1", "2" ])
+        self.assertEqual(list(table["b"]), [ "-", [ "3", "4" ] ])
+
+    def test_categorical(self):
+        path = self.write_file([ "a,b,c" ] + [ "{},{},{}".format(i, "xyz"[i % 3], i % 2 or "") for i in range(40) ])
+        table = ReadColumns(path, types={ "c": "category" }, intern_columns="auto", use_numpy=False)
+        self.assertIsInstance(table["b"], CategoricalColumn)
+        self.assertIsInstance(table["c"], CategoricalColumn)
+        self.assertIsInstance(table["a"], StringColumn)
+        self.assertEqual(table["b"].GetCategories(), [ "x", "y", "z" ])
+        self.assertEqual(list(table["b"].GetCodes())[:4], [ 0, 1, 2, 0 ])
+        self.assertEqual(list(table["b"]), [ "xyz"[i % 3] for i in range(40) ])
+        self.assertEqual(table["c"][0], "")
+        self.assertEqual(table["c"][1], "1")
+
+    def test_conversion_error(self):
+        path = self.write_file([ "a", "1", "x" ])
+        table = ReadColumns(path, types={ "a": int }, quiet=True)
+        self.assertIsNotNone(table.reader.GetError())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+tests for csvindex
+"""
+import os
+import tempfile
+import unittest
+
+# pylint: disable=wildcard-import,missing-function-docstring,unused-wildcard-import
+
+from readcsv.csvindex import *
+
+
+class TestCsvIndex(unittest.TestCase):
+    """ Test CsvIndex """
+
+    def write_file(self, lines):
+        fd, path = tempfile.mkstemp(".csv")
+        self.addCleanup(os.unlink, path)
+        self.addCleanup(lambda: os.path.exists(path + ".idx") and os.unlink(path + ".idx"))
+        with open(fd, "w") as f:
+            for line in lines:
+                print(line, file=f)
+        return path
+
+    def test_read_range(self):
+        lines = [ "# generated", "a,b" ] + [ "{},x{}".format(i, i) if i % 7 else "# skipped" for i in range(100) ]
+        path = self.write_file(lines)
+        for style in [ "relative", "absolute" ]:
+            options = dict(skip="#", row_numbers="n", row_number_style=style, dictify=True, dict_type=dict, return_header_row=False)
+            expected = list(CsvReader(**options).Read(path))
+            index = CsvIndex(path, every=10, **options)
+            self.assertEqual(len(index), len(expected))
+            self.assertEqual(index.GetHeader(), [ "a", "b" ])
+            self.assertEqual(list(index.ReadRange(0, 1000)), expected)
+            numbers = [ row["n"] for row in expected ]
+            self.assertEqual(list(index.ReadRange(numbers[23], numbers[57])), expected[23:57])
+            for idx in [ 0, 9, 10, 11, 42, len(expected) - 1 ]:
+                self.assertEqual(index.GetRow(numbers[idx]), expected[idx])
+            with self.assertRaises(IndexError):
+                index.GetRow(numbers[-1] + 1)
+
+    def test_sidecar(self):
+        path = self.write_file([ "a,b", "1,2", "3,4", "5,6" ])
+        index = CsvIndex(path, every=2, infer_types=True)
+        self.assertTrue(os.path.exists(path + ".idx"))
+        self.assertEqual(index.GetTypes(), { "a": "int", "b": "int" })
+        # The header row is row 0
+        self.assertEqual(index.GetRow(3), [ 5, 6 ])
+
+        # Reused, unless the file or the options change
+        saved = index.index
+        self.assertEqual(CsvIndex(path, every=2, infer_types=True).index, saved)
+        self.assertNotEqual(CsvIndex(path, every=1, infer_types=True).index["offsets"], saved["offsets"])
+        with open(path, "a") as f:
+            print("7,8", file=f)
+        index = CsvIndex(path, every=1, infer_types=True)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(list(index.ReadRange(3, 5)), [ [ 5, 6 ], [ 7, 8 ] ])
+
+        # The stored types depend on infer_types, and any types given take precedence over them
+        index = CsvIndex(path, every=1)
+        self.assertIsNone(index.GetTypes())
+        self.assertEqual(index.GetRow(3), [ "5", "6" ])
+        index = CsvIndex(path, every=1, infer_types=True, types={ "a": float })
+        self.assertEqual(index.GetTypes(), { "b": "int" })
+        self.assertEqual(index.GetRow(3), [ 5.0, 6 ])
+        self.assertEqual(CsvIndex(path, every=1, infer_types=True).GetRow(3), [ 5, 6 ])
+
+if __name__ == '__main__':
+    unittest.main()
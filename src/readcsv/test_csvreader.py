@@ -1,6 +1,16 @@
 """
 tests for csvreader
 """
+import os
+import bz2
+import gzip
+import lzma
+import asyncio
+import pickle
+import datetime
+import tempfile
+import threading
+import tracemalloc
 import unittest
 
 # pylint: disable=wildcard-import,missing-function-docstring,unused-wildcard-import
@@ -11,6 +21,10 @@ from readcsv.csvreader import *
 def reader(**kwargs):
     return CsvReader(dict_type=dict, **kwargs)
 
+def exit_worker(_value):
+    """ A converter which ends the (worker) process """
+    os._exit(1)  # pylint: disable=protected-access
+
 class TestCsvParsing(unittest.TestCase):
     """ Test class CsvReader """
 
@@ -65,6 +79,80 @@ class TestCsvParsing(unittest.TestCase):
         #         self.assertEqual(rows[i][j], expected[i][j])
         self.assertEqual(rows, expected)
 
+    def test_split_line(self):
+        r = CsvReader()
+        self.assertEqual(r.SplitLine('a,b,c'), [ 'a', 'b', 'c' ])
+        self.assertEqual(r.SplitLine('"1",b,hello'), [ '1', 'b', 'hello' ])
+        self.assertEqual(r.SplitLine('"a""b",c'), [ 'ab', 'c' ])
+        self.assertEqual(r.SplitLine('"x",'), [ 'x', '' ])
+        self.assertEqual(r.SplitLine('"'), [ '' ])
+
+    def test_batched(self):
+        lines = TestCsvParsing.input_lines
+        expected = TestCsvParsing.expected
+        r = CsvReader(block_size=4)
+        batches = list(r.ProcessLinesBatched([ "" ] + lines, batch_size=5))
+        self.assertEqual([ len(b) for b in batches ], [ 5, 5, 5 ])
+        self.assertEqual(sum(batches, []), expected)
+        self.assertEqual(r.absolute_row_number, len(lines))
+        self.assertEqual(r.relative_row_number, len(lines) - 1)
+
+    def test_binary(self):
+        lines = [ line.encode("utf-8") for line in TestCsvParsing.input_lines ]
+        expected = TestCsvParsing.expected
+
+        r = CsvReader(binary=True, encoding="utf-8")
+        self.assertEqual(list(r.ProcessLines(lines)), expected)
+        self.assertEqual(r.SplitBytes(b'"a""b",c'), [ b'ab', b'c' ])
+
+        r = CsvReader(raw_bytes=True, encoding="utf-8")
+        self.assertEqual(list(r.ProcessLines(lines)), [ expected[0] ] + [ [ field.encode("utf-8") for field in row ] for row in expected[1:] ])
+
+        r = CsvReader(binary=True, encoding="utf-8", usecols=[ "d", "a" ], where={ "b": "b c d" })
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "d", "a" ] ] + [ [ row[3], row[0] ] for row in expected[7:12] ])
+
+        data = "a,b,c,d\r\n# x\r\n1,é,2020-01-02,\r\n2,\"ü,v\",,w,x\r\n".encode("utf-8")
+        r = CsvReader(raw_bytes=True, encoding="utf-8", skip="#", types={ "a": "int", "b": "str", "c": "date" }, extra_columns_method="append-last")
+        self.assertEqual(list(r.ProcessData(data)), [ [ "a", "b", "c", "d" ], [ 1, "é", datetime.date(2020, 1, 2), b"" ], [ 2, "ü,v", None, b"w,x" ] ])
+
+    def test_backends(self):
+        lines = TestCsvParsing.input_lines
+        expected = TestCsvParsing.expected
+
+        r = CsvReader(backend='auto')
+        self.assertEqual(list(r.ProcessLines(lines)), expected)
+        self.assertEqual(r.GetBackend(), 'python')
+
+        plain = [ 'a,b,c', '1,"2,3",4', '"5",6,7' ]
+        plain_expected = [ [ 'a', 'b', 'c' ], [ '1', '2,3', '4' ], [ '5', '6', '7' ] ]
+        for backend in [ 'python', 'stdlib' ]:
+            r = CsvReader(backend=backend)
+            self.assertEqual(list(r.ProcessLines(plain)), plain_expected)
+            self.assertEqual(r.GetBackend(), backend)
+
+        r = CsvReader(backend='auto', backend_sample=2)
+        self.assertEqual(list(r.ProcessLines(plain + [ '"8""",9' ])), plain_expected + [ [ '8"', '9' ] ])
+        self.assertEqual(r.GetBackend(), 'stdlib')
+
+        # The backend changes after the sample, so the same line is split differently within and after it
+        doubled = [ 'a,b', '"x""y",1', '2,3', '"x""y",4' ]
+        r = CsvReader(backend='auto', backend_sample=3)
+        self.assertEqual(list(r.ProcessLines(doubled)), [ [ 'a', 'b' ], [ 'xy', '1' ], [ '2', '3' ], [ 'xy', '4' ] ])
+        self.assertEqual(r.GetBackend(), 'python')
+        r = CsvReader(backend='auto', backend_sample=2)
+        self.assertEqual(list(r.ProcessLines(doubled[:1] + doubled[2:])), [ [ 'a', 'b' ], [ '2', '3' ], [ 'x"y', '4' ] ])
+        self.assertEqual(r.GetBackend(), 'stdlib')
+
+        r = CsvReader(backend='stdlib', extra_columns_method='append-last')
+        self.assertEqual(list(r.ProcessLines([ 'a,b', '1,"2",3' ])), [ [ 'a', 'b' ], [ '1', '2,3' ] ])
+
+        # A block is split with a single csv reader, which must not continue an open quote onto the next line
+        ragged = [ '1,"2', '3,4', '"5,6', '"7"', '', '8,"9"', 'x' * 200000 + ',"y' ]
+        r = CsvReader(backend='stdlib')
+        self.assertEqual(r.SplitLinesStdlib(ragged), [ r.SplitLineStdlib(line) for line in ragged ])
+        self.assertEqual(r.SplitLinesStdlib(ragged)[:5], [ [ '1', '2' ], [ '3', '4' ], [ '5,6' ], [ '7' ], [ '' ] ])
+        self.assertEqual(CsvReader(backend='stdlib').ProcessBlock(plain + ragged[:4]), list(CsvReader(backend='stdlib').ProcessLines(plain + ragged[:4])))
+
 
 class TestExtraColumnHandling(unittest.TestCase):
     """ Test class CsvReader """
@@ -72,9 +160,14 @@ class TestExtraColumnHandling(unittest.TestCase):
     def check_data(self, testdata):
         for t in testdata:
             r, lines, expected_columns, expected = t
+            options = r.options
             rows = list(r.ProcessLines(lines))
             self.assertEqual(expected_columns, r.GetColumns())
             self.assertEqual(expected, rows)
+            r = CsvReader(**options)
+            rows = sum(r.ProcessLinesBatched(lines), [])
+            self.assertEqual(expected_columns, r.GetColumns())
+            self.assertEqual(expected, rows)
 
     def test_extra_columns(self):
         abc = [ "a", "b", "c" ]
@@ -101,6 +194,136 @@ class TestExtraColumnHandling(unittest.TestCase):
         ]
         self.check_data(testdata)
 
+    def test_row_numbers(self):
+        lines = [ "a,b", "", "1,2", "# comment", "3" ]
+        r = reader(dictify=True, row_numbers="_row", skip="#", missing_values="-")
+        self.assertEqual(list(r.ProcessLines(lines))[1:], [ { "_row": 2, "a": "1", "b": "2" }, { "_row": 4, "a": "3", "b": "-" } ])
+        r = reader(dictify=True, row_numbers="_row", row_number_style="relative", skip="#")
+        rows = sum(r.ProcessLinesBatched(lines), [])
+        self.assertEqual(rows[1:], [ { "_row": 1, "a": "1", "b": "2" }, { "_row": 2, "a": "3", "b": None } ])
+
+    def test_usecols(self):
+        lines = [ "a,b,c", '1,"2,x",3', "4,5", "6,7,8,9,10" ]
+        r = reader(usecols=[ "c", 0 ])
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "c", "a" ], [ "3", "1" ], [ None, "4" ], [ "8", "6" ] ])
+        self.assertEqual(r.GetColumns(), [ "a", "b", "c" ])
+
+        r = reader(usecols=[ "b", "column_5" ], dictify=True, return_header_row=False)
+        rows = sum(r.ProcessLinesBatched(lines), [])
+        self.assertEqual(rows, [ { "b": "2,x", "column_5": None }, { "b": "5", "column_5": None }, { "b": "7", "column_5": "10" } ])
+        self.assertEqual(r.GetColumns(), [ "a", "b", "c", "column_4", "column_5" ])
+
+        r = reader(usecols=[ "a", "extra" ], extra_columns_method="store:as-list", extra_columns="extra", return_header_row=False)
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "1", None ], [ "4", None ], [ "6", [ "9", "10" ] ] ])
+
+        r = reader(usecols=[ "c" ], extra_columns_method="append-last", return_header_row=False)
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "3" ], [ None ], [ "8,9,10" ] ])
+
+        r = reader(usecols=[ "c", "a" ], types={ "a": "int" }, return_header_row=False)
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "3", 1 ], [ None, 4 ], [ "8", 6 ] ])
+
+        for options in [ dict(), dict(extra_columns_method="store", extra_columns="extra"), dict(extra_columns="col{:02}") ]:
+            r = reader(usecols=[ "a", "column_2" ], quiet=True, **options)
+            self.assertEqual(list(r.ProcessLines(lines))[1], [ "1", None ])
+            self.assertEqual(r.GetError(), "Unknown column column_2 in usecols")
+        r = reader(usecols=[ "a", "col04" ], extra_columns="col{:02}", return_header_row=False)
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "1", None ], [ "4", None ], [ "6", "9" ] ])
+
+    def test_where(self):
+        lines = [ "a,b,c", '1,"x,y",3', "2,z", "3,xa,5,6", "4,q,7" ]
+        r = reader(where={ "b": Prefix("x") }, return_header_row=False)
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "1", "x,y", "3" ], [ "3", "xa", "5", "6" ] ])
+        self.assertEqual(r.GetFilteredCount(), 2)
+
+        r = reader(where={ "b": Prefix(("é", "q")) }, raw_bytes=True, encoding="latin-1", return_header_row=False)
+        self.assertEqual(list(r.ProcessLines([ line.encode("latin-1") for line in lines + [ "5,éa,1" ] ])), [ [ b"4", b"q", b"7" ], [ b"5", "éa".encode("latin-1"), b"1" ] ])
+
+        r = reader(where={ "b": "q" }, dictify=True, row_numbers="n", row_number_style="relative", return_header_row=False)
+        self.assertEqual(list(r.ProcessLines(lines)), [ { "n": 0, "a": "4", "b": "q", "c": "7" } ])
+        self.assertEqual(r.GetFilteredCount(), 3)
+
+        r = reader(where={ "a": { "2", "4" }, "c": lambda v: v is None or int(v) > 5 }, return_header_row=False, dictify=True)
+        rows = sum(r.ProcessLinesBatched(lines), [])
+        self.assertEqual(rows, [ { "a": "2", "b": "z", "c": None }, { "a": "4", "b": "q", "c": "7" } ])
+        self.assertEqual(r.GetFilteredCount(), 2)
+
+        r = reader(where={ "c": "5" }, usecols=[ "a" ], types={ "a": "int" }, return_header_row=False)
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ 3 ] ])
+
+        r = reader(where={ "d": "5" })
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "a", "b", "c" ] ])
+        self.assertEqual(r.GetFilteredCount(), 4)
+        self.assertEqual(r.GetError(), "Unknown column d in where")
+
+        # A predicate on an unknown column is not called
+        r = reader(where={ "d": lambda value: value.startswith("5") }, quiet=True)
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "a", "b", "c" ] ])
+        self.assertEqual(r.GetError(), "Unknown column d in where")
+        r = reader(where={ "d": lambda value: True }, quiet=True)
+        self.assertEqual(list(r.ProcessLines(lines)), [ [ "a", "b", "c" ] ])
+        self.assertEqual(r.GetFilteredCount(), 4)
+
+    def test_stats(self):
+        lines = [ "# comment", "a,b,c", '1,"x,y",3', "", "2,z", "3,xa,5,6", "4,q,7" ]
+        self.assertIsNone(reader().GetStats())
+        reported = []
+        r = reader(skip="#", where={ "b": Prefix("x") }, dictify=True, stats=True, stats_sample=1, stats_every=1, stats_callback=reported.append)
+        self.assertEqual(len(list(r.ProcessLines(lines))), 3)
+        stats = r.GetStats()
+        self.assertEqual(stats["lines"], 7)
+        self.assertEqual(stats["bytes"], sum(len(line) + 1 for line in lines))
+        self.assertEqual(stats["rows"], 3)
+        self.assertEqual(stats["skipped"], { "skip_count": 0, "skip": 1, "empty": 1 })
+        self.assertEqual(stats["filtered"], 2)
+        # Rows discarded by where are not fully split
+        self.assertEqual((stats["quoted_lines"], stats["unquoted_lines"]), (1, 1))
+        self.assertEqual(stats["extra_columns"], { "generate": 1 })
+        self.assertEqual(stats["timings"]["where"]["calls"], 4)
+        self.assertEqual(stats["timings"]["finish"]["calls"], 2)
+        self.assertGreaterEqual(stats["timings"]["split"]["estimated_seconds"], 0)
+        self.assertEqual(reported, [ stats ])
+
+    def test_record_rows(self):
+        abc = [ "a", "b", "c" ]
+        in_data = [ "a,b,c", "1,2", "3,4,5,6" ]
+        testdata = [
+            [ reader(row_type='record'),                                        in_data, abc + [ "column_4" ], [ abc, { "a": "1", "b": "2", "c": None }, { "a": "3", "b": "4", "c": "5", "column_4": "6" } ] ],
+            [ reader(row_type='record', extra_columns_method='append-last'),    in_data, abc,                  [ abc, { "a": "1", "b": "2", "c": None }, { "a": "3", "b": "4", "c": "5,6" } ] ],
+        ]
+        self.check_data(testdata)
+
+        r = reader(row_type='record', row_numbers="_row", return_header_row=False, types={ "a": "int" })
+        rows = list(r.ProcessLines(in_data + [ "7,8,9" ]))
+        self.assertEqual([ type(row).__mro__[1] for row in rows ], [ Record ] * 3)
+        self.assertIs(type(rows[0]), type(rows[2]))
+        self.assertEqual((rows[0].a, rows[0]["b"], rows[0].get("c", "-"), rows[0].get("d", "-")), (1, "2", None, "-"))
+        self.assertEqual((rows[1]["_row"], rows[1].column_4, rows[2][3]), (2, "6", "9"))
+        self.assertEqual(dict(rows[2]), { "_row": 3, "a": 7, "b": "8", "c": "9" })
+        self.assertEqual(list(rows[0]), [ "_row", "a", "b", "c" ])
+        self.assertTrue("a" in rows[0] and "d" not in rows[0])
+        self.assertEqual(pickle.loads(pickle.dumps(rows[1])), rows[1])
+        with self.assertRaises(AttributeError):
+            rows[0].a = 2
+
+    def test_lazy_rows(self):
+        lines = [ "a,b,c", '1,"x,y",3', "2,z", "3,xa,5,6" ]
+        r = reader(lazy=True, return_header_row=False, row_numbers="n", types={ "a": "int" })
+        rows = list(r.ProcessLines(lines))
+        self.assertEqual([ row.raw() for row in rows ], lines[1:])
+        # Nothing is split until a field is accessed
+        self.assertEqual(r.GetColumns(), [ "a", "b", "c" ])
+        self.assertEqual((rows[0]["b"], rows[0].a, rows[0][2], rows[0].n), ("x,y", 1, "3", 1))
+        self.assertEqual(rows[1], [ 2, "z", None ])
+        self.assertEqual(rows[2], { "n": 3, "a": 3, "b": "xa", "c": "5", "column_4": "6" })
+        self.assertEqual(r.GetColumns(), [ "a", "b", "c", "column_4" ])
+        self.assertEqual(pickle.loads(pickle.dumps(rows[0])), rows[0])
+
+        r = reader(lazy=True, usecols=[ "c", "a" ], where={ "b": Prefix("x") }, return_header_row=False)
+        self.assertEqual([ row.items() for row in r.ProcessLines(lines) ], [ [ ("c", "3"), ("a", "1") ], [ ("c", "5"), ("a", "3") ] ])
+
+        with self.assertRaises(ValueError):
+            reader(lazy=True, infer_types=True)
+
     def test_header_validation(self):
         # pylint: disable=too-many-locals
         in_header      = [ "a,b,c" ]
@@ -127,5 +350,417 @@ class TestExtraColumnHandling(unittest.TestCase):
             self.assertIsNotNone(r.GetError())
 
 
+class TestTypeConversion(unittest.TestCase):
+    """ Test type conversion and inference """
+
+    lines = [ "n,x,d,s", "1,1.5,2024-01-02,a", "2,,2024-02-03,b", "3,4,2024-03-04,c" ]
+
+    def test_types(self):
+        r = reader(types={ "n": "int", "x": float, "s": str.upper }, block_size=2)
+        rows = list(r.ProcessLines(self.lines))
+        self.assertEqual(rows[1:], [ [ 1, 1.5, "2024-01-02", "A" ], [ 2, None, "2024-02-03", "B" ], [ 3, 4.0, "2024-03-04", "C" ] ])
+
+    def test_infer_types(self):
+        r = reader(infer_types=True, dictify=True, return_header_row=False)
+        rows = list(r.ProcessLines(self.lines))
+        self.assertEqual(r.GetTypes(), { "n": "int", "x": "float", "d": "date", "s": "str" })
+        self.assertEqual(rows[2], { "n": 3, "x": 4.0, "d": datetime.date(2024, 3, 4), "s": "c" })
+
+        r = reader(infer_types=True, return_header_row=False)
+        rows = [ r.ProcessLine(line) for line in self.lines ]
+        self.assertEqual(rows[1], [ 1, 1.5, datetime.date(2024, 1, 2), "a" ])
+
+    def test_intern_columns(self):
+        lines = [ "a,b,c" ] + [ "{},{},{}".format(i, "xyz"[i % 3], "p" if i % 2 else "") for i in range(30) ]
+        r = reader(intern_columns=[ "b", "c" ], types={ "a": "int" }, return_header_row=False, keep_rows=True)
+        rows = list(r.ProcessLines(lines))
+        self.assertEqual(rows[:3], [ [ 0, "x", "" ], [ 1, "y", "p" ], [ 2, "z", "" ] ])
+        self.assertIs(rows[0][1], rows[3][1])
+        self.assertIs(rows[1][2], rows[29][2])
+        self.assertEqual(sorted(r.GetInternTable("b")), [ "x", "y", "z" ])
+
+        r = reader(intern_columns="auto", return_header_row=False)
+        rows = list(r.ProcessLines(lines))
+        self.assertEqual(r.GetInternColumns(), [ "b", "c" ])
+        self.assertIs(rows[0][1], rows[3][1])
+        self.assertIsNot(rows[0][0], rows[3][0])
+
+    def test_type_errors(self):
+        lines = [ "n,s", "1,a", "x,b", "3,c" ]
+        r = reader(types={ "n": "int" }, quiet=True)
+        rows = list(r.ProcessLines(lines))
+        self.assertEqual(rows, [ [ "n", "s" ], [ 1, "a" ] ])
+        self.assertEqual(r.GetError(), "Failed converting value 'x' in column n")
+
+        # The rows before the first failing row are produced, with every typed column converted
+        r = reader(types={ "n": "int", "s": "int" }, quiet=True, return_header_row=False)
+        rows = list(r.ProcessLines([ "n,s", "1,2", "3,4", "5,y", "x,6", "7,8" ]))
+        self.assertEqual(rows, [ [ 1, 2 ], [ 3, 4 ] ])
+        self.assertEqual(r.GetError(), "Failed converting value 'y' in column s")
+
+        r = reader(types={ "n": "int" }, type_errors='missing', quiet=True)
+        self.assertEqual(list(r.ProcessLines(lines))[1:], [ [ 1, "a" ], [ None, "b" ], [ 3, "c" ] ])
+        self.assertEqual(r.GetConversionErrors(), 1)
+
+        r = reader(types={ "n": "int" }, type_errors='keep', quiet=True)
+        self.assertEqual(list(r.ProcessLines(lines))[1:], [ [ 1, "a" ], [ "x", "b" ], [ 3, "c" ] ])
+
+
+class TestStreaming(unittest.TestCase):
+    """ Test reading files incrementally """
+
+    def write_file(self, rows):
+        fd, path = tempfile.mkstemp(".csv")
+        self.addCleanup(os.unlink, path)
+        with open(fd, "w") as f:
+            print("a,b,c", file=f)
+            for i in range(rows):
+                print("{},x,\"y,{}\"".format(i, i), file=f)
+        return path
+
+    def peak_memory(self, path, **kwargs):
+        r = reader(read_size=4096, **kwargs)
+        tracemalloc.start()
+        try:
+            count = sum(1 for _row in r.Read(path))
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return count, peak
+
+    def test_read_chunks(self):
+        path = self.write_file(10)
+        r = reader(read_size=7, keep_rows=True)
+        rows = list(r.Read(path))
+        self.assertEqual(rows[0], [ "a", "b", "c" ])
+        self.assertEqual(rows[1:], [ [ str(i), "x", "y,{}".format(i) ] for i in range(10) ])
+        self.assertEqual(r.rows, rows[1:])
+
+    def test_read_ragged_extra_columns(self):
+        lines = [ "a,b,c", "1,2,3,4", "1,2,3,4,5", "6,7,8" ]
+        fd, path = tempfile.mkstemp(".csv")
+        self.addCleanup(os.unlink, path)
+        with open(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        for options in [ dict(dictify=True), dict(row_type="record"), dict(lazy=True) ]:
+            expected = list(reader(**options).ProcessLines(lines))
+            rows = list(reader(**options).Read(path))
+            self.assertEqual(rows, expected)
+            self.assertEqual(rows[1], { "a": "1", "b": "2", "c": "3", "column_4": "4" })
+
+    def test_read_overridden_methods(self):
+        # pylint: disable=missing-class-docstring
+        path = self.write_file(3)
+
+        class UpperData(CsvReader):
+            def HandleData(self, line):
+                return super().HandleData(line.upper())
+
+        class SkipLines(CsvReader):
+            def ProcessLine(self, line):
+                if line.startswith("1,"):
+                    return None
+                return super().ProcessLine(line)
+
+        class TruncateExtras(CsvReader):
+            def HandleExtraColumns(self, row):
+                return self.header, row[:2], None
+
+        expected = [ [ "a", "b", "c" ], [ "0", "X", "Y,0" ], [ "1", "X", "Y,1" ], [ "2", "X", "Y,2" ] ]
+        for cls, rows in [ (UpperData, expected), (SkipLines, [ [ "a", "b", "c" ], [ "0", "x", "y,0" ], [ "2", "x", "y,2" ] ]),
+                           (TruncateExtras, [ [ "a", "b", "c" ], [ "0", "x" ], [ "1", "x" ], [ "2", "x" ] ]) ]:
+            self.assertEqual(list(cls().Read(path)), rows)
+            self.assertEqual(list(cls(usecols=[ "a", "b" ]).Read(path)), [ [ "a", "b" ] ] + [ row[:2] for row in rows[1:] ])
+            with open(path) as f:
+                self.assertEqual(list(cls(types={ "a": "int" }).ProcessLines(f)), rows[:1] + [ [ int(row[0]) ] + row[1:] for row in rows[1:] ])
+
+    def test_read_errors(self):
+        # pylint: disable=missing-class-docstring
+        path = self.write_file(3)
+
+        class FailingRows(CsvReader):
+            def AddRow(self, row):
+                raise RuntimeError("no")
+
+        r = FailingRows(quiet=True)
+        list(r.Read(path))
+        self.assertEqual(r.GetError(), "Failed processing line:2,x,\"y,2\"")
+        r = FailingRows(quiet=True)
+        r.Poll(path)
+        self.assertEqual(r.GetError(), "Failed processing line:2,x,\"y,2\"")
+
+        with open(path, "a") as f:
+            print("x,y,z", file=f)
+        r = reader(types={ "a": "int" }, raise_error=True, quiet=True)
+        with self.assertRaisesRegex(ValueError, "^Failed converting value 'x' in column a$"):
+            list(r.Read(path))
+        r = reader(types={ "a": "int" }, raise_error=True, quiet=True)
+        with self.assertRaisesRegex(ValueError, "^Failed converting value 'x' in column a$"):
+            r.Poll(path)
+
+    def test_read_stats(self):
+        path = self.write_file(100)
+        r = reader(block_size=10, stats=True, types={ "a": "int" })
+        self.assertEqual(len(list(r.Read(path))), 101)
+        stats = r.GetStats()
+        self.assertEqual(stats["lines"], 101)
+        self.assertEqual(stats["bytes"], os.path.getsize(path))
+        self.assertEqual(stats["quoted_lines"], 100)
+        self.assertEqual(stats["timings"]["read"]["calls"], 11)
+        self.assertEqual(stats["timings"]["convert"]["calls"], 11)
+        self.assertEqual(stats["timings"]["consumer"]["calls"], 11)
+
+    def test_read_mmap(self):
+        path = self.write_file(100)
+        expected = list(reader().Read(path))
+        for read_size in [ 5, 64, 1024 * 1024 ]:
+            self.assertEqual(list(reader(mmap=True, read_size=read_size).Read(path)), expected)
+
+        fd, path = tempfile.mkstemp(".csv")
+        self.addCleanup(os.unlink, path)
+        with open(fd, "w") as f:
+            f.write("\n\n# comment\na,b\n\n\xe9,2")
+        r = reader(mmap=True, skip_count=1, skip="#", encoding="utf-8")
+        self.assertEqual(list(r.Read(path)), [ [ "a", "b" ], [ "\xe9", "2" ] ])
+        self.assertEqual(r.absolute_row_number, 5)
+
+        open(path, "w").close()
+        r = reader(mmap=True)
+        self.assertEqual(list(r.Read(path)), [])
+        self.assertIsNone(r.GetError())
+
+    def test_read_batches(self):
+        path = self.write_file(10)
+        expected = list(reader().Read(path))
+        batches = list(reader(block_size=3).ReadBatches(path, batch_size=4))
+        self.assertEqual([ len(b) for b in batches ], [ 4, 4, 3 ])
+        self.assertEqual(sum(batches, []), expected)
+
+    def test_rows_not_kept(self):
+        path = self.write_file(10)
+        r = reader()
+        self.assertEqual(len(list(r.Read(path))), 11)
+        self.assertEqual(r.rows, [])
+
+    def test_memory_flat(self):
+        small_count, small_peak = self.peak_memory(self.write_file(5000))
+        large_count, large_peak = self.peak_memory(self.write_file(50000))
+        self.assertEqual((small_count, large_count), (5001, 50001))
+        self.assertLess(large_peak, small_peak * 2)
+
+    def test_read_compressed(self):
+        path = self.write_file(2000)
+        expected = list(reader().Read(path))
+        for module in [ gzip, bz2, lzma ]:
+            with open(path, "rb") as f:
+                data = module.compress(f.read())
+            fd, compressed = tempfile.mkstemp(".csv")
+            self.addCleanup(os.unlink, compressed)
+            with open(fd, "wb") as f:
+                f.write(data)
+            self.assertEqual(list(reader(read_size=1000).Read(compressed)), expected)
+            self.assertEqual(list(reader(read_size=1000, decompress_thread=True).Read(compressed)), expected)
+            self.assertEqual(list(reader().ParallelRead(compressed, workers=2)), expected)
+
+        # Stopping part way through stops the decompression thread
+        r = reader(read_size=100, decompress_thread=True)
+        rows = r.Read(compressed)
+        next(rows)
+        rows.close()
+        self.assertEqual(threading.active_count(), 1)
+
+    def test_read_pipe(self):
+        path = self.write_file(500)
+        with open(path, "rb") as f:
+            data = f.read()
+        expected = list(reader().Read(path))
+        pipe = os.path.join(tempfile.mkdtemp(), "pipe")
+        self.addCleanup(os.rmdir, os.path.dirname(pipe))
+        self.addCleanup(os.unlink, pipe)
+        os.mkfifo(pipe)
+        for module, options in [ (None, dict()), (None, dict(binary=True, encoding="utf-8")), (None, dict(mmap=True)),
+                                 (gzip, dict()), (None, dict(workers=2)) ]:
+            payload = module.compress(data) if module else data
+            def write(payload=payload):
+                with open(pipe, "wb") as f:
+                    f.write(payload)
+            writer = threading.Thread(target=write)
+            writer.start()
+            workers = options.pop("workers", None)
+            r = reader(read_size=1000, **options)
+            rows = list(r.ParallelRead(pipe, workers=workers) if workers else r.Read(pipe))
+            writer.join()
+            self.assertIsNone(r.GetError())
+            self.assertEqual(len(rows), len(expected))
+            if not options.get("binary"):
+                self.assertEqual(rows, expected)
+
+    def test_read_binary(self):
+        path = self.write_file(100)
+        expected = list(reader().Read(path))
+        for kwargs in [ {}, { "mmap": True }, { "read_size": 7 } ]:
+            self.assertEqual(list(reader(binary=True, **kwargs).Read(path)), expected)
+        self.assertEqual(list(reader(binary=True).ParallelRead(path, workers=2, chunk_size=100)), expected)
+
+    def test_follow(self):
+        path = self.write_file(0)
+        checkpoint = path + ".state"
+        self.addCleanup(lambda: os.path.exists(checkpoint) and os.unlink(checkpoint))
+        r = reader(row_numbers="n", dictify=True, return_header_row=False, read_size=16)
+        self.assertEqual(r.Poll(path), [])
+        with open(path, "a") as f:
+            f.write("1,2,3\n4,5,6,7\n8,")
+        self.assertEqual(sum(r.Follow(path, interval=0, idle_timeout=0), []), [ { "n": 1, "a": "1", "b": "2", "c": "3" }, { "n": 2, "a": "4", "b": "5", "c": "6", "column_4": "7" } ])
+        r.SaveState(checkpoint)
+
+        # A new reader resumes from the checkpoint, including the partial line and the generated column
+        with open(path, "a") as f:
+            f.write("9\n")
+        r = reader(row_numbers="n", dictify=True, return_header_row=False)
+        self.assertTrue(r.LoadState(checkpoint))
+        self.assertEqual(r.Poll(path), [ { "n": 3, "a": "8", "b": "9", "c": None } ])
+        self.assertEqual(r.GetColumns(), [ "a", "b", "c", "column_4" ])
+
+        # Truncation (or rotation) starts again from the header
+        with open(path, "w") as f:
+            f.write("x,y\n1,2\n")
+        self.assertEqual(r.Poll(path), [ { "n": 1, "x": "1", "y": "2" } ])
+        self.assertEqual(r.Poll(path), [])
+
+        # Rotation to a file with the columns in another order resolves the types again
+        rotated = path + ".new"
+        self.addCleanup(lambda: os.path.exists(rotated) and os.unlink(rotated))
+        with open(path, "w") as f:
+            f.write("n,s,f\n1,a,x\n")
+        for options in [ { "types": { "n": "int" } }, { "infer_types": True, "intern_columns": [ "s" ] } ]:
+            r = reader(return_header_row=False, **options)
+            self.assertEqual(r.Poll(path), [ [ 1, "a", "x" ] ])
+            with open(rotated, "w") as f:
+                f.write("s,n,f\nb,2,1.5\n")
+            os.replace(rotated, path)
+            self.assertEqual(r.Poll(path), [ [ "b", 2, 1.5 if options.get("infer_types") else "1.5" ] ])
+            self.assertIsNone(r.GetError())
+            with open(path, "w") as f:
+                f.write("n,s,f\n1,a,x\n")
+        with open(path, "w") as f:
+            f.write("x,y\n1,2\n")
+
+        # Polls which only read filtered lines are not idle
+        with open(path, "a") as f:
+            f.write("3,4\n" * 20 + "5,6\n")
+        r = reader(where={ "x": "5" }, return_header_row=False, read_size=16)
+        self.assertEqual(sum(r.Follow(path, interval=0, idle_timeout=0), []), [ [ "5", "6" ] ])
+
+    def test_read_async(self):
+        data = "# comment\r\na,b\r\n1,\"é,x\"\r\n2,3,4\r\n5".encode("utf-8")
+        expected = [ [ "a", "b" ], [ "1", "é,x" ], [ "2", "3", "4" ], [ "5" ] ]
+
+        async def chunks(size):
+            for i in range(0, len(data), size):
+                yield data[i:i + size]
+
+        async def collect(rows):
+            return [ row async for row in rows ]
+
+        async def read_stream(r, **kwargs):
+            stream = asyncio.StreamReader()
+            stream.feed_data(data)
+            stream.feed_eof()
+            return [ row async for row in r.ReadAsync(stream, **kwargs) ]
+
+        for size in [ 1, 2, 5, 100 ]:
+            r = reader(skip="#", encoding="utf-8")
+            self.assertEqual(asyncio.run(collect(r.ReadAsync(chunks(size)))), expected)
+        r = reader(skip="#", encoding="utf-8", read_size=4)
+        self.assertEqual(asyncio.run(read_stream(r, executor=True, executor_min_size=2)), expected)
+        self.assertEqual(r.GetColumns(), [ "a", "b", "column_3" ])
+
+
+class TestParallelRead(unittest.TestCase):
+    """ Test reading files with a pool of processes """
+
+    def write_file(self, lines):
+        fd, path = tempfile.mkstemp(".csv")
+        self.addCleanup(os.unlink, path)
+        with open(fd, "w") as f:
+            for line in lines:
+                print(line, file=f)
+        return path
+
+    def compare(self, path, **kwargs):
+        serial = reader(**kwargs)
+        expected = list(serial.Read(path))
+        parallel = reader(**kwargs)
+        rows = list(parallel.ParallelRead(path, workers=2, chunk_size=200))
+        self.assertIsNone(parallel.GetError())
+        self.assertEqual(rows, expected)
+        self.assertEqual(parallel.GetColumns(), serial.GetColumns())
+        self.assertEqual(parallel.absolute_row_number, serial.absolute_row_number)
+        self.assertEqual(parallel.relative_row_number, serial.relative_row_number)
+        return rows
+
+    def test_parallel_read(self):
+        lines = [ "junk", "a,b,c" ] + [ "{},x,\"y,{}\"".format(i, i) for i in range(200) ]
+        lines[150] = "150,x,y,extra1,extra2"
+        lines[160] = ""
+        lines[170] = "# comment"
+        path = self.write_file(lines)
+        rows = self.compare(path, skip_count=1, skip="#")
+        self.assertEqual(len(rows), 199)
+        self.compare(path, skip_count=1, skip="#", dictify=True, return_header_row=False)
+        self.compare(path, skip_count=1, skip="#", extra_columns_method='store', extra_columns='extra')
+        self.compare(path, skip_count=1, skip="#", dictify=True, row_numbers='_row')
+        self.compare(path, skip_count=1, skip="#", dictify=True, row_numbers='_row', row_number_style='relative')
+
+    def test_parallel_read_store(self):
+        # Lines with extra values in several ranges, each with a different number of them
+        lines = [ "a,b,c" ] + [ "{},x,y".format(i) for i in range(200) ]
+        for i in range(10, 200, 30):
+            lines[i] = ",".join([ str(i), "x", "y" ] + [ "e{}".format(n) for n in range(i % 4 + 1) ])
+        path = self.write_file(lines)
+        self.compare(path, extra_columns_method='store', extra_columns='extra')
+        self.compare(path, extra_columns_method='store:as-list', extra_columns='extra')
+        self.compare(path, extra_columns_method='store', extra_columns='extra', dictify=True)
+
+    def test_parallel_read_workers(self):
+        path = self.write_file([ "a,b" ] + [ "{},{}".format(i, i % 3) for i in range(200) ])
+        # A lambda can not be passed to a worker process, so the file is read serially
+        rows = self.compare(path, where={ "b": lambda value: value == "1" })
+        self.assertEqual(len(rows), 1 + 67)
+        # A failed worker process is reported through the error
+        r = reader(quiet=True, types={ "a": exit_worker })
+        rows = list(r.ParallelRead(path, workers=2, chunk_size=200))
+        self.assertEqual(rows, [ [ "a", "b" ] ])
+        self.assertTrue(r.GetError().startswith("Failed reading file {}: ".format(path)))
+
+    def test_parallel_read_no_header(self):
+        path = self.write_file([ "{},{}".format(i, i * 2) for i in range(100) ] + [ "1,2,3" ])
+        rows = self.compare(path, has_header=False, header=[ "a", "b" ])
+        self.assertEqual(rows[-1], [ "1", "2", "3" ])
+
+    def test_read_many(self):
+        first = self.write_file([ "a,b", "1,2", "3,4" ])
+        second = self.write_file([ "a,b", "5,6,7" ])
+        other = self.write_file([ "b,a", "8,9" ])
+        missing = first + ".missing"
+        paths = [ first, second, other, missing ]
+        for mode in [ "thread", "process" ]:
+            r = reader(dictify=True, quiet=True)
+            rows = list(r.ReadMany(paths, workers=2, mode=mode))
+            self.assertEqual(rows, [ (first, { "a": "1", "b": "2" }), (first, { "a": "3", "b": "4" }),
+                                     (second, { "a": "5", "b": "6", "column_3": "7" }), (other, { "b": "8", "a": "9" }) ])
+            self.assertEqual(r.GetColumns(), [ "a", "b", "column_3" ])
+            self.assertEqual(list(r.GetFileErrors()), [ missing ])
+            self.assertEqual(r.GetError(), "Failed reading 1 of 4 files")
+
+        r = reader(quiet=True, expected_header=[ "a", "b" ])
+        rows = list(r.ReadMany(paths[:3]))
+        self.assertEqual(rows, [ (first, [ "1", "2" ]), (first, [ "3", "4" ]), (second, [ "5", "6", "7" ]) ])
+        self.assertEqual(list(r.GetFileErrors()), [ other ])
+
+        pattern = os.path.join(os.path.dirname(first), "*" + os.path.basename(first))
+        self.assertEqual(len(list(reader().ReadMany(pattern))), 2)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+"""
+tests for lookup
+"""
+import os
+import tempfile
+import unittest
+
+# pylint: disable=wildcard-import,missing-function-docstring,unused-wildcard-import
+
+from readcsv.lookup import *
+
+
+class TestReadIndexed(unittest.TestCase):
+    """ Test ReadIndexed """
+
+    def write_file(self, lines):
+        fd, path = tempfile.mkstemp(".csv")
+        self.addCleanup(os.unlink, path)
+        with open(fd, "w") as f:
+            for line in lines:
+                print(line, file=f)
+        return path
+
+    def test_unique(self):
+        path = self.write_file([ "id,name,size,colour", "1,a,10,red", "2,b,20", "3,c,30,blue" ])
+        table = ReadIndexed(path, "id", types={ "id": "int", "size": "int" })
+        self.assertIsNone(table.GetError())
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.GetColumns(), [ "name", "size", "colour" ])
+        self.assertEqual(table.get(2), { "name": "b", "size": 20, "colour": None })
+        self.assertEqual(table[3].colour, "blue")
+        self.assertIsNone(table.get(4))
+        self.assertEqual(table.get_all(1), [ ( "a", 10, "red" ) ])
+        self.assertEqual(table.get_all(4), [])
+
+        table = ReadIndexed(path, [ "name", "id" ], values=[ "colour" ])
+        self.assertEqual(table.get(("c", "3")), { "colour": "blue" })
+        self.assertNotIn(("c", 3), table)
+
+    def test_duplicates(self):
+        path = self.write_file([ "k,v", "a,1", "b,2", "a,3" ])
+        self.assertEqual(ReadIndexed(path, "k", duplicates="first")["a"].v, "1")
+        self.assertEqual(ReadIndexed(path, "k", duplicates="last")["a"].v, "3")
+        table = ReadIndexed(path, "k", unique=False)
+        self.assertEqual([ row.v for row in table.get_all("a") ], [ "1", "3" ])
+        self.assertEqual(table.get_all("b"), [ { "v": "2" } ])
+        table = ReadIndexed(path, "k", quiet=True)
+        self.assertEqual(table.GetError(), "Duplicate key 'a' in {}".format(path))
+        self.assertEqual(ReadIndexed(path, "x", quiet=True).GetError(), "Unknown column x for ReadIndexed")
+
+    def test_saved(self):
+        path = self.write_file([ "k,v", "a,1", "b,2" ])
+        index_path = path + ".lookup"
+        self.addCleanup(lambda: os.path.exists(index_path) and os.unlink(index_path))
+        table = ReadIndexed(path, "k", index_path=index_path)
+        self.assertTrue(os.path.exists(index_path))
+        with open(index_path, "rb") as fh:
+            saved = fh.read()
+        # Loaded rather than read again, unless the file or the arguments change
+        self.assertEqual(ReadIndexed(path, "k", index_path=index_path).entries, table.entries)
+        self.assertEqual(LookupTable.Load(index_path)["b"], { "v": "2" })
+        with open(index_path, "rb") as fh:
+            self.assertEqual(fh.read(), saved)
+        self.assertEqual(ReadIndexed(path, "v", index_path=index_path)["2"], { "k": "b" })
+        with open(path, "a") as f:
+            print("c,3", file=f)
+        self.assertEqual(len(ReadIndexed(path, "k", index_path=index_path)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()